@@ -1,487 +1,987 @@
-import json
-from datetime import datetime, date
-import plotly.express as px
-import plotly.graph_objects as go
-import streamlit as st
-import pandas as pd
-
-# Page Configuration
-st.set_page_config(page_title="Civitas Dashboard", layout="wide", page_icon="🏗")
-st.title("🏗 Welcome to Civitas Construction Dashboard!")
-st.markdown("### Your all-in-one tool for managing construction projects 🚀")
-st.markdown("---")
-
-# Initialize Session State
-if 'logged_in' not in st.session_state:
-    st.session_state.logged_in = False
-if 'user_role' not in st.session_state:
-    st.session_state.user_role = None
-if 'projects' not in st.session_state:
-    st.session_state.projects = []
-if 'username' not in st.session_state:
-    st.session_state.username = None
-
-
-# Custom serializer for datetime objects
-
-
-def custom_serializer(obj):
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    raise TypeError(f"Type {type(obj)} not serializable")
-
-
-# Save projects to JSON
-
-
-def save_projects():
-    try:
-        with open("projects.json", "w") as file:
-            json.dump(st.session_state.projects, file, indent=4, default=custom_serializer)
-    except Exception as e:
-        st.error(f"Error saving projects: {e}")
-
-
-# Load projects from JSON
-
-
-def load_projects():
-    try:
-        with open("projects.json", "r") as file:
-            st.session_state.projects = json.load(file)
-    except FileNotFoundError:
-        st.session_state.projects = []
-
-
-# Login/Register System
-
-
-def login_register():
-    with st.sidebar:
-        st.header("🔑 Login/Register")
-        action_choice = st.radio("Choose an action", ["Login", "Register"])
-
-        if action_choice == "Login":
-            username = st.text_input("Username")
-            password = st.text_input("Password", type="password")
-            if st.button("Login"):
-                if username == "admin" and password == "admin":
-                    st.session_state.logged_in = True
-                    st.session_state.user_role = "Admin"
-                    st.session_state.username = username
-                    st.success(f"Welcome back, Admin!")
-                elif username == "user" and password == "user":
-                    st.session_state.logged_in = True
-                    st.session_state.user_role = "User"
-                    st.session_state.username = username
-                    st.success(f"Welcome back, {username}!")
-                else:
-                    st.error("Invalid credentials. Try again.")
-                    st.warning("Make sure you enter 'admin' as the username and password to test the login!")
-
-        elif action_choice == "Register":
-            new_username = st.text_input("Choose Username")
-            new_password = st.text_input("Choose Password", type="password")
-            confirm_password = st.text_input("Confirm Password", type="password")
-            if st.button("Register"):
-                if new_username and new_password == confirm_password:
-                    st.success(f"Account created successfully for {new_username}!")
-                else:
-                    st.error("Passwords do not match or fields are empty.")
-
-
-# Display Login/Register if not logged in
-
-
-if not st.session_state.logged_in:
-    login_register()
-else:
-    st.sidebar.header(f"👋 Welcome, {st.session_state.username}!")
-    if st.sidebar.button("Logout"):
-        st.session_state.logged_in = False
-        st.experimental_rerun()
-
-    # Tabs for Dashboard
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📂 Project Overview", "📊 Progress Tracking", "💰 Financials",
-                                                  "✅ Task Management", "📄 Documents", "💼 Interim Claims"])
-
-    # Tab 1: Project Overview
-    with tab1:
-        st.header("📂 Project Overview")
-        st.markdown("View and manage all your projects here.")
-        project_action = st.radio("Choose an action", ["Register New Project", "View Existing Projects"])
-
-        if project_action == "Register New Project":
-            with st.form(key="project_form"):
-                col1, col2 = st.columns(2)
-                with col1:
-                    project_name = st.text_input("Project Name")
-                    project_id = st.text_input("Project ID")
-                    client_name = st.text_input("Client Name")
-                with col2:
-                    start_date = st.date_input("Start Date")
-                    end_date = st.date_input("End Date", min_value=start_date)
-                    budget = st.number_input("Budget ($)", min_value=0, value=100000)
-
-                submit = st.form_submit_button("Register Project")
-                if submit:
-                    if not project_name or not project_id or not client_name:
-                        st.error("All fields are required!")
-                    else:
-                        new_project = {
-                            "name": project_name,
-                            "id": project_id,
-                            "client": client_name,
-                            "start_date": start_date.isoformat(),
-                            "end_date": end_date.isoformat(),
-                            "budget": budget,
-                            "progress": 0,
-                            "tasks": [],
-                            "documents": [],
-                            "interim_claims": []  # Ensure interim_claims is initialized as an empty list
-                        }
-
-                        st.session_state.projects.append(new_project)
-                        save_projects()
-                        st.success(f"Project {project_name} registered successfully!")
-
-        elif project_action == "View Existing Projects":
-            load_projects()
-
-            if st.session_state.projects:
-                project_names = [proj["name"] for proj in st.session_state.projects]
-                selected_project = st.selectbox("Select a Project to Track", project_names,
-                                                key="existing_project_select")
-                project_data = next(proj for proj in st.session_state.projects if proj["name"] == selected_project)
-                st.write("**Project Details:**")
-                st.json(project_data)
-
-                # Option to delete project
-                if st.button("Delete Project", key=f"delete_{selected_project}"):
-                    st.session_state.projects = [proj for proj in st.session_state.projects if
-                                                 proj["name"] != selected_project]
-                    save_projects()
-                    st.success(f"Project {selected_project} deleted successfully!")
-            else:
-                st.info("No projects available. Please register a new project.")
-
-    # Tab 2: Progress Tracking
-    with tab2:
-        st.header("📊 Progress Tracking")
-        st.write("Monitor project progress with interactive visuals.")
-        if st.session_state.projects:
-            project_names = [proj["name"] for proj in st.session_state.projects]
-            selected_project = st.selectbox("Select a Project to Track", project_names, key="progress_tracking_select")
-            project_data = next(proj for proj in st.session_state.projects if proj["name"] == selected_project)
-
-            if "progress" not in project_data:
-                project_data["progress"] = 0  # Initialize progress if not present
-
-            progress = st.slider("Update Progress (%)", 0, 100, project_data["progress"],
-                                 key=f"progress_slider_{selected_project}")
-            project_data["progress"] = progress
-            save_projects()
-            st.success(f"Updated progress for {project_data['name']} to {progress}%!")
-
-            # Display progress using a gauge chart
-            fig = go.Figure(go.Indicator(
-                mode="gauge+number",
-                value=progress,
-                title={"text": "Project Progress"},
-                gauge={"axis": {"range": [0, 100]}}))
-            st.plotly_chart(fig)
-
-            # Display overall progress graph
-            st.subheader("Project Progress - Milestone Overview")
-            milestone_data = {
-                'Milestone': ['Planning', 'Design', 'Construction', 'Completion'],
-                'Progress': [20, 40, 60, progress]
-            }
-            progress_fig = px.bar(milestone_data, x='Milestone', y='Progress', title="Project Milestones")
-            st.plotly_chart(progress_fig)
-
-    # Tab 3: Financials
-    with tab3:
-        st.header("💰 Financial Overview")
-        st.write("Track budgets and spending dynamically.")
-        if st.session_state.projects:
-            project_names = [proj["name"] for proj in st.session_state.projects]
-            selected_project = st.selectbox("Select a Project for Financials", project_names, key="financials_select")
-            project_data = next(proj for proj in st.session_state.projects if proj["name"] == selected_project)
-
-            spent = st.number_input("Spent Amount ($)", min_value=0, value=0, key=f"spent_input_{selected_project}")
-            remaining = project_data["budget"] - spent
-            st.write(f"Remaining Budget: ${remaining}")
-
-            # Display financial breakdown
-            financial_data = {
-                "Spent": spent,
-                "Remaining": remaining,
-                "Total Budget": project_data["budget"]
-            }
-            financial_fig = px.pie(names=list(financial_data.keys()), values=list(financial_data.values()),
-                                   title="Budget Breakdown")
-            st.plotly_chart(financial_fig)
-
-    # Tab 4: Task Management
-    with tab4:
-        st.header("📅 Task Management & Scheduling")
-        st.write("Manage and schedule tasks efficiently for each project.")
-
-        if st.session_state.projects:
-            project_names = [proj["name"] for proj in st.session_state.projects]
-            selected_project = st.selectbox("Select a Project", project_names, key="task_management_select")
-            project_data = next(proj for proj in st.session_state.projects if proj["name"] == selected_project)
-
-            # Display existing tasks
-            st.subheader("Current Tasks")
-            if project_data["tasks"]:
-                for task in project_data["tasks"]:
-                    st.write(f"**Task:** {task['task_name']}")
-                    st.write(f"**Assigned To:** {task['assigned_to']}")
-                    st.write(f"**Priority:** {task['priority']}")
-                    st.write(f"**Deadline:** {task['deadline']}")
-                    st.write(f"**Status:** {task['status']}")
-                    st.write(f"**Description:** {task['description']}")
-
-                    # Task status update
-                    status_update = st.selectbox(f"Update Status for {task['task_name']}",
-                                                 ["Pending", "In Progress", "Completed"],
-                                                 key=f"status_update_{task['task_name']}")
-                    if st.button(f"Update Status for {task['task_name']}", key=f"update_button_{task['task_name']}"):
-                        task["status"] = status_update
-                        save_projects()
-                        st.success(f"Status of {task['task_name']} updated to {status_update}.")
-
-                    # Task comments
-                    st.subheader(f"Comments on {task['task_name']}")
-                    task_comments = st.text_area(f"Add a comment for {task['task_name']}",
-                                                 key=f"comment_{task['task_name']}")
-                    if st.button(f"Save Comment for {task['task_name']}", key=f"comment_button_{task['task_name']}"):
-                        if 'comments' not in task:
-                            task['comments'] = []
-                        task['comments'].append(task_comments)
-                        save_projects()
-                        st.success(f"Comment added for {task['task_name']}.")
-
-            else:
-                st.info("No tasks available. Please add new tasks.")
-
-            # Adding a new task
-            st.subheader("Add a New Task")
-            task_name = st.text_input("Task Name")
-            assigned_to = st.text_input("Assign to")
-            priority = st.selectbox("Priority", ["High", "Medium", "Low"])
-            deadline = st.date_input("Deadline")
-            description = st.text_area("Task Description")
-
-            if st.button("Add Task"):
-                if task_name and assigned_to and description:
-                    new_task = {
-                        "task_name": task_name,
-                        "assigned_to": assigned_to,
-                        "priority": priority,
-                        "deadline": deadline,
-                        "status": "Pending",  # Default status
-                        "description": description,
-                        "comments": []  # Comments section for the task
-                    }
-                    project_data["tasks"].append(new_task)
-                    save_projects()
-                    st.success(f"New task '{task_name}' added successfully!")
-                else:
-                    st.error("Please fill in all the required fields.")
-
-            # Task Search & Filter
-            st.subheader("Search and Filter Tasks")
-            search_query = st.text_input("Search for a task")
-            filtered_tasks = [task for task in project_data["tasks"] if
-                              search_query.lower() in task["task_name"].lower()]
-
-            if filtered_tasks:
-                for task in filtered_tasks:
-                    st.write(f"**Task Name:** {task['task_name']}")
-                    st.write(f"Assigned to: {task['assigned_to']}")
-                    st.write(f"Priority: {task['priority']}")
-                    st.write(f"Deadline: {task['deadline']}")
-                    st.write(f"Status: {task['status']}")
-            else:
-                st.info("No tasks found matching the search query.")
-
-            # Gantt Chart Representation (Optional)
-            st.subheader("Task Timeline (Gantt Chart)")
-            # You can implement this using a package like Plotly or Altair for interactive Gantt charts
-            # Example placeholder for Gantt chart integration
-            # Gantt chart would be shown here for visualizing task timelines.
-
-            # Task Scheduling - Gantt chart integration can also be added here
-            st.write("Gantt Chart could be integrated here to visualize tasks' timelines.")
-
-    # Tab 5: Documents
-    with tab5:
-        st.header("📄 Document Management")
-        st.write("Upload and manage project documents.")
-
-        if st.session_state.projects:
-            project_names = [proj["name"] for proj in st.session_state.projects]
-            selected_project = st.selectbox("Select a Project for Documents", project_names,
-                                            key="document_management_select")
-            project_data = next(proj for proj in st.session_state.projects if proj["name"] == selected_project)
-
-            # Show uploaded documents
-            st.subheader("Uploaded Documents")
-            if project_data["documents"]:
-                for idx, doc in enumerate(project_data["documents"]):
-                    st.write(f"**Document {idx + 1}:**")
-                    st.text(f"Filename: {doc.name}")
-                    st.text(f"Type: {doc.type}")
-                    st.download_button(label="Download", data=doc, file_name=doc.name)
-                    if st.button(f"Delete Document {idx + 1}", key=f"delete_doc_{idx}"):
-                        project_data["documents"].remove(doc)
-                        save_projects()
-                        st.success(f"Document {doc.name} deleted successfully!")
-            else:
-                st.info("No documents uploaded yet. Please upload a new document.")
-
-            # Upload multiple documents
-            uploaded_files = st.file_uploader("Upload Documents", type=["pdf", "docx", "png", "jpg", "jpeg"],
-                                              accept_multiple_files=True)
-            if uploaded_files:
-                for uploaded_file in uploaded_files:  # Renaming 'file' to 'uploaded_file'
-                    project_data["documents"].append(uploaded_file)
-                save_projects()
-                st.success("Documents uploaded successfully!")
-
-            # Document categorization (example: project-specific tags)
-            categories = ["Contracts", "Plans", "Invoices", "Reports"]
-            doc_category = st.selectbox("Select Document Category", categories)
-            st.text(f"Selected category: {doc_category}")
-
-            # Option to add metadata for documents
-            st.subheader("Add Document Metadata")
-            doc_title = st.text_input("Document Title")
-            doc_description = st.text_area("Document Description")
-            if st.button("Save Metadata"):
-                if doc_title and doc_description:
-                    metadata = {"Title": doc_title, "Description": doc_description}
-                    st.session_state.document_metadata = metadata
-                    st.success("Metadata saved!")
-                else:
-                    st.error("Please fill in both the title and description fields.")
-
-    # Tab 6: Interim Claims
-    with tab6:
-        st.header("💼 Interim Claims")
-        st.write("Manage interim claims and track payments.")
-
-        if st.session_state.projects:
-            project_names = [proj["name"] for proj in st.session_state.projects]
-            selected_project = st.selectbox("Select a Project for Interim Claims", project_names,
-                                            key="interim_claims_select")
-            project_data = next(proj for proj in st.session_state.projects if proj["name"] == selected_project)
-
-            # Ensure interim_claims is initialized
-            if "interim_claims" not in project_data:
-                project_data["interim_claims"] = []
-
-            interim_claim_action = st.radio("Interim Claims Action",
-                                            ["View Claims", "Add New Claim", "Update Claim Status"])
-
-            if interim_claim_action == "Add New Claim":
-                # Add New Claim Form
-                claim_amount = st.number_input("Claim Amount ($)", min_value=0)
-                claim_status = st.selectbox("Claim Status", ["Pending", "Approved", "Rejected"])
-                payment_schedule = st.date_input("Payment Schedule")
-                notes = st.text_area("Claim Notes", placeholder="Add any notes or comments")
-
-                if st.button("Add Claim"):
-                    project_data["interim_claims"].append({
-                        "amount": claim_amount,
-                        "status": claim_status,
-                        "payment_schedule": payment_schedule.isoformat(),
-                        "notes": notes
-                    })
-                    save_projects()
-                    st.success(f"Claim of ${claim_amount} added successfully!")
-
-            elif interim_claim_action == "View Claims":
-                # View Claims in Table Form with Search and Filter
-                if project_data["interim_claims"]:
-                    # Convert claims data to DataFrame
-                    claims_df = pd.DataFrame(project_data["interim_claims"])
-                    claims_df.index += 1  # Start indexing from 1
-                    claims_df = claims_df.rename(columns={
-                        "amount": "Claim Amount ($)",
-                        "status": "Claim Status",
-                        "payment_schedule": "Payment Schedule",
-                        "notes": "Claim Notes"
-                    })
-
-                    # Filter by status, amount, or date
-                    filter_status = st.selectbox("Filter by Claim Status", ["All", "Pending", "Approved", "Rejected"],
-                                                 index=0)
-                    if filter_status != "All":
-                        claims_df = claims_df[claims_df["Claim Status"] == filter_status]
-
-                    # Search bar for amount or notes
-                    search_term = st.text_input("Search Claims", "")
-                    if search_term:
-                        claims_df = claims_df[
-                            claims_df.apply(lambda row: row.astype(str).str.contains(search_term).any(), axis=1)]
-
-                    # Sorting options
-                    sort_by = st.selectbox("Sort Claims By", ["Claim Amount ($)", "Payment Schedule", "Claim Status"],
-                                           index=0)
-                    claims_df = claims_df.sort_values(by=sort_by, ascending=True)
-
-                    # Display the claims table
-                    st.dataframe(claims_df)
-
-                    # Export Claims to CSV
-                    if st.button("Export Claims to CSV"):
-                        csv = claims_df.to_csv(index=False)
-                        st.download_button("Download CSV", csv, "claims_data.csv", "text/csv")
-
-                else:
-                    st.info("No interim claims found for this project.")
-
-            elif interim_claim_action == "Update Claim Status":
-                # Update Existing Claim Status
-                if project_data["interim_claims"]:
-                    claim_options = [f"Claim #{idx + 1}" for idx in range(len(project_data["interim_claims"]))]
-                    selected_claim = st.selectbox("Select a Claim to Update", claim_options)
-
-                    # Get the selected claim's index
-                    claim_idx = claim_options.index(selected_claim)
-                    selected_claim_data = project_data["interim_claims"][claim_idx]
-
-                    # Allow user to update the status of the selected claim
-                    new_status = st.selectbox("Update Claim Status", ["Pending", "Approved", "Rejected"],
-                                              index=["Pending", "Approved", "Rejected"].index(
-                                                  selected_claim_data["status"]))
-
-                    if st.button(f"Update Status for {selected_claim}"):
-                        # Update the claim's status
-                        project_data["interim_claims"][claim_idx]["status"] = new_status
-                        save_projects()
-                        st.success(f"The status for {selected_claim} has been updated to {new_status}.")
-                else:
-                    st.info("No interim claims found for this project.")
-
-            # Claim History or Audit Trail
-            if project_data["interim_claims"]:
-                st.subheader("Claim History / Audit Trail")
-                # Updated for handling missing 'notes'
-                audit_data = []
-                for claim in project_data["interim_claims"]:
-                    audit_data.append({
-                        "Claim Amount": claim["amount"],
-                        "Status": claim["status"],
-                        "Payment Schedule": claim["payment_schedule"],
-                        "Notes": claim.get("notes", "No notes provided")
-                        # Using get to avoid errors if 'notes' is missing
-                    })
-
-                if audit_data:
-                    audit_df = pd.DataFrame(audit_data)
-                    st.write(audit_df)
+import uuid
+
+import streamlit as st
+from streamlit_option_menu import option_menu
+from figures import FigureCache
+from instrumentation import Timings
+from repository import ConflictError, open_repository
+
+# pandas and plotly (and claims/timeline, which use them) take most of a cold start, so they are
+# imported inside the sections and cached helpers that need them. The login screen never loads them.
+
+# Page Configuration
+st.set_page_config(page_title="Civitas Dashboard", layout="wide", page_icon="🏗")
+st.title("🏗 Welcome to Civitas Construction Dashboard!")
+st.markdown("### Your all-in-one tool for managing construction projects 🚀")
+st.markdown("---")
+
+# Rows per page for the task grid, task search and claims table
+PAGE_SIZE = 50
+# Larger portfolios get a search box, and the project pickers list at most this many matches
+PICKER_OPTIONS = 200
+TASK_STATUSES = ["Pending", "In Progress", "Completed"]
+ROLLUP_LABELS = {
+    "budget": "Budget",
+    "spent": "Spent",
+    "claimed": "Claimed",
+    "approved": "Approved",
+    "pending": "Pending",
+    "remaining": "Remaining",
+}
+# Dashboard sections and their Bootstrap icon names; only the selected section runs on a rerun
+SECTIONS = {
+    "Project Overview": "folder2-open",
+    "Progress Tracking": "bar-chart",
+    "Financials": "cash-coin",
+    "Task Management": "check2-square",
+    "Documents": "file-earmark-text",
+    "Interim Claims": "briefcase",
+}
+CLAIM_LABELS = {
+    "amount": "Claim Amount ($)",
+    "status": "Claim Status",
+    "payment_schedule": "Payment Schedule",
+    "notes": "Claim Notes"
+}
+CLAIM_EVENT_LABELS = {
+    "recorded_at": "Recorded At (UTC)",
+    "actor": "By",
+    "claim_id": "Claim",
+    "kind": "Change",
+    "old_status": "From",
+    "status": "To",
+    "amount": "Claim Amount ($)",
+    "payment_schedule": "Payment Schedule",
+    "notes": "Claim Notes",
+}
+
+# Initialize Session State
+if 'logged_in' not in st.session_state:
+    st.session_state.logged_in = False
+if 'user_role' not in st.session_state:
+    st.session_state.user_role = None
+if 'username' not in st.session_state:
+    st.session_state.username = None
+
+
+# Timing spans and counters shared by every session; recording is off until an admin turns it on
+
+
+@st.cache_resource
+def get_timings():
+    return Timings()
+
+
+timings = get_timings()
+st.session_state.reruns = st.session_state.get("reruns", 0) + 1
+timings.count("reruns")
+if timings.enabled:
+    # Short random id per browser session; st.session_state itself is one proxy shared by all of them
+    st.session_state.setdefault("timing_session", uuid.uuid4().hex[:12])
+    span_fields = {"session": st.session_state.timing_session, "rerun": st.session_state.reruns}
+else:
+    span_fields = {}
+
+
+# One repository (and so one copy of the project registry) shared by every session in this process
+
+
+@st.cache_resource
+def get_repository():
+    from exports import remove_stale_exports
+    # Exports abandoned by the sessions of an earlier run of the app
+    remove_stale_exports()
+    return open_repository()
+
+
+# Fetch the shared repository, reloading it if another process has written to the database
+
+
+def load_projects():
+    with timings.span("load_projects", **span_fields):
+        shared_repo = get_repository()
+        shared_repo.refresh()
+    return shared_repo
+
+
+repo = load_projects()
+registry = repo.registry
+# Project versions as this session last displayed them; writes are checked against these so that
+# a change made by another session in between is reported instead of silently overwritten
+seen_versions = st.session_state.setdefault("seen_versions", {})
+shown_projects = set()
+
+
+# Run a repository write
+# Writes to an existing project pass project_id so the write is checked against the version this
+# session last saw. Returns the write's result (False when nothing changed), or False on failure.
+
+
+def save_projects(write, *args, project_id=None):
+    try:
+        with timings.span("save_projects", write=write.__name__, project=project_id, **span_fields):
+            if project_id is None:
+                return write(*args)
+            result = write(*args, expected_version=seen_versions.get(project_id))
+    except ConflictError as e:
+        st.warning(str(e))
+        # The warning asks the user to review and try again; that retry is checked against the latest version
+        if project_id in repo.registry:
+            seen_versions[project_id] = repo.registry.get(project_id)["version"]
+        return False
+    except Exception as e:
+        st.error(f"Error saving projects: {e}")
+        return False
+    # Our own write moved the version on; later writes in this run build on it
+    if project_id in repo.registry:
+        seen_versions[project_id] = repo.registry.get(project_id)["version"]
+    return result
+
+
+# Document downloads are read from the memory-mapped blob and shared by every session,
+# so a large drawing set is held in memory once rather than once per session
+
+
+@st.cache_resource(max_entries=4)
+def document_payload(digest):
+    with repo.blobs.open_mapped(digest) as mapped:
+        return bytes(mapped)
+
+
+# Finished export files are read once and shared, like document downloads
+
+
+@st.cache_resource(max_entries=2)
+def export_payload(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+# Typed claims table for one project, rebuilt only when the project's revision changes. Revisions
+# (registry.revision) never repeat, unlike versions, which restart when a project id is reused.
+
+
+@st.cache_resource(max_entries=16)
+def load_claims_table(project_id, revision):
+    from claims import ClaimsTable
+    return ClaimsTable(repo.list_claims(project_id))
+
+
+# Task intervals for one project's Gantt chart, rebuilt only when the project's revision changes
+
+
+@st.cache_resource(max_entries=16)
+def load_task_frame(project_id, revision):
+    from timeline import task_frame
+    return task_frame(repo.list_task_schedule(project_id))
+
+
+# One figure cache for every session in this process
+
+
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+
+figures = get_figure_cache()
+
+
+# Chart builders, only ever called through figures.get(builder, *inputs). A builder may depend on
+# nothing but its arguments, and the figures it returns are shared, so they are never modified.
+# Only actual builds are timed; a cache hit never calls the builder.
+
+
+@timings.timed("chart.progress_gauge")
+def progress_gauge(progress):
+    import plotly.graph_objects as go
+    return go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=progress,
+        title={"text": "Project Progress"},
+        gauge={"axis": {"range": [0, 100]}}))
+
+
+@timings.timed("chart.milestone_bar")
+def milestone_bar(milestone_data):
+    import plotly.express as px
+    return px.bar(milestone_data, x='Milestone', y='Progress', title="Project Milestones")
+
+
+@timings.timed("chart.budget_pie")
+def budget_pie(financial_data):
+    import plotly.express as px
+    return px.pie(names=list(financial_data.keys()), values=list(financial_data.values()), title="Budget Breakdown")
+
+
+# Claim amounts per month, stacked by status; monthly is FinancialRollups.monthly()
+
+
+@timings.timed("chart.cash_flow_bar")
+def cash_flow_bar(monthly):
+    import plotly.express as px
+    rows = [{"Month": month, "Status": status, "Amount": amount}
+            for month, bucket in monthly.items() for status, amount in bucket.items()]
+    return px.bar(rows, x="Month", y="Amount", color="Status", title="Monthly Cash Flow (by payment schedule)")
+
+
+# Gantt figures; the revision and data_version arguments stand in for the data, which is loaded
+# only on a miss
+
+
+@timings.timed("chart.task_timeline_figure")
+def task_timeline_figure(project_id, revision, start, end, group_by, every_task):
+    from timeline import task_segments, task_timeline, visible
+    frame = visible(load_task_frame(project_id, revision), start, end)
+    return task_segments(frame) if every_task else task_timeline(frame, group_by)
+
+
+@timings.timed("chart.portfolio_timeline_figure")
+def portfolio_timeline_figure(data_version, start, end):
+    from timeline import portfolio_timeline, project_frame, visible
+    return portfolio_timeline(visible(project_frame(list(repo.registry)), start, end))
+
+
+# Export controls. Each session has at most one export, which an exports.ExportJob writes to a temp
+# file in the background; starting another discards the previous one, and so does downloading it.
+# Exports that are never downloaded are left to exports.remove_stale_exports.
+
+
+def export_panel(project_id, dataset, key):
+    from exports import EXPORT_DATASETS, EXPORT_FORMATS, ExportJob
+    columns = st.columns(3)
+    datasets, scopes, formats = list(EXPORT_DATASETS), ["This project", "All projects"], list(EXPORT_FORMATS)
+    dataset = columns[0].selectbox("Data", datasets, format_func=EXPORT_DATASETS.get,
+                                   index=kept_index(f"{key}_dataset", datasets, datasets.index(dataset)),
+                                   **keep(f"{key}_dataset"))
+    scope = columns[1].selectbox("Scope", scopes, index=kept_index(f"{key}_scope", scopes), **keep(f"{key}_scope"))
+    export_format = columns[2].selectbox("Format", formats, index=kept_index(f"{key}_format", formats),
+                                         **keep(f"{key}_format"))
+    if st.button("Start Export", key=f"{key}_start"):
+        if st.session_state.get("export_job") is not None:
+            st.session_state.export_job.discard()
+        st.session_state.export_job = ExportJob(repo, dataset, export_format,
+                                                project_id if scope == "This project" else None)
+
+    job = st.session_state.get("export_job")
+    if job is None:
+        return
+    if not job.done:
+        export_progress(job)
+    elif job.error:
+        st.error(f"Export of {job.file_name} failed: {job.error}")
+    elif not job.available:
+        st.info(f"The export of {job.file_name} has expired; please start it again.")
+    else:
+        st.download_button(f"Download {job.file_name} ({job.written:,} rows)", export_payload(job.path),
+                           job.file_name, job.mime_type, key=f"{key}_download", on_click=finish_export)
+
+
+# The browser is served the copy Streamlit already holds, so the file can go as soon as the
+# download is clicked
+
+
+def finish_export():
+    st.session_state.export_job.discard()
+    st.session_state.export_job = None
+    export_payload.clear()
+
+
+# Only this fragment reruns while an export is being written; the whole page reruns once it is done
+
+
+@st.fragment(run_every=1)
+def export_progress(job):
+    if job.done:
+        st.rerun()
+    st.progress(job.progress, text=f"Exporting {job.file_name}: {job.written:,} of {job.total or 0:,} rows")
+
+
+# Bulk import of projects, tasks or claims from a file. Rows are validated in chunks and every valid
+# row is written in one transaction; the report lists the rows that were rejected.
+
+
+def import_panel():
+    from importer import IMPORT_FORMATS, file_format_of, import_file
+    with st.form(key="import_form"):
+        dataset = st.selectbox("Import", ["projects", "tasks", "claims"], format_func=str.capitalize)
+        uploaded_file = st.file_uploader("File", type=[extension[1:] for extension in IMPORT_FORMATS])
+        skip_invalid = st.checkbox("Import the valid rows even if some rows are invalid")
+        if not st.form_submit_button("Import") or uploaded_file is None:
+            return
+    report = save_projects(import_file, repo, dataset, uploaded_file, file_format_of(uploaded_file.name),
+                           skip_invalid, st.session_state.username)
+    if not report:
+        return
+    if report.committed:
+        st.success(f"Imported {report.rows_imported:,} of {report.rows_read:,} {dataset}.")
+    else:
+        st.error(f"{report.error_count:,} of {report.rows_read:,} rows are invalid; nothing was imported.")
+    if report.errors:
+        if report.error_count > len(report.errors):
+            st.caption(f"Showing the first {len(report.errors):,} of {report.error_count:,} errors")
+        st.dataframe(report.errors, hide_index=True,
+                     column_config={"row": "Row", "column": "Column", "error": "Error"})
+
+
+# Admin sidebar panel: the recording switch, counters and p50/p95 per span since recording started.
+# The switch is process-wide, like the recorder itself.
+
+
+def toggle_timings():
+    if st.session_state.record_timings:
+        timings.enable()
+    else:
+        timings.disable()
+
+
+def timing_panel():
+    with st.sidebar:
+        st.subheader("⏱ Performance")
+        st.session_state.record_timings = timings.enabled
+        st.toggle("Record timings (all sessions)", key="record_timings", on_change=toggle_timings)
+        if not timings.enabled:
+            return
+        counters = timings.counters
+        st.caption(f"Reruns: {st.session_state.reruns} in this session · {counters.get('reruns', 0):,} recorded · "
+                   f"chart JSON served {figures.stats['served_bytes'] / 1024 ** 2:.1f} MB · claims tables "
+                   f"{counters.get('claims_dataframe_bytes', 0) / 1024 ** 2:.1f} MB")
+        st.dataframe(timings.summary(), hide_index=True, column_config={
+            "span": "Span", "count": "Count",
+            "p50_ms": st.column_config.NumberColumn("p50 (ms)", format="%.1f"),
+            "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.1f")})
+        st.caption(f"Every span is also logged to {timings.log_path}")
+        if st.button("Reset Timings"):
+            timings.reset()
+
+
+# Widgets of the sections that are not selected are not rendered, and Streamlit drops the state of
+# a widget that was not rendered, so coming back to a section would reset its pickers, pages and
+# filters. Those widgets are created with **keep(key), which copies every change into a plain
+# session-state entry, and take kept(key) as their value.
+
+
+def keep(key):
+    return {"key": key, "on_change": _keep, "args": (key,)}
+
+
+def _keep(key):
+    st.session_state[f"kept_{key}"] = st.session_state[key]
+
+
+def kept(key, default=None):
+    return st.session_state.get(f"kept_{key}", default)
+
+
+# Index of the kept choice among `options`, or of `default` when it is no longer one of them
+
+
+def kept_index(key, options, default=0):
+    options = list(options)
+    return options.index(kept(key)) if kept(key) in options else default
+
+
+# Project picker shared by the tabs; remembers which projects this run displayed. Options come from
+# the registry alone, and above PICKER_OPTIONS projects only the matches for a search are sent to
+# the browser, so the picker costs the same whatever the size of the portfolio.
+
+
+def select_project(label, key):
+    selected = kept(key)
+    if len(registry) <= PICKER_OPTIONS:
+        options = registry.ids()
+    else:
+        search = st.text_input(f"Find a project ({len(registry):,} in total)", kept(f"{key}_search", ""),
+                               placeholder="Type part of a project name or ID", **keep(f"{key}_search"))
+        options = registry.search(search, PICKER_OPTIONS)
+        # Keep the current choice selectable while the search is being changed
+        if selected in registry and selected not in options:
+            options.insert(0, selected)
+        if not options:
+            st.caption("No projects match your search.")
+            options = registry.search("", PICKER_OPTIONS)
+    project_id = st.selectbox(label, options, index=kept_index(key, options), format_func=registry.label,
+                              **keep(key))
+    shown_projects.add(project_id)
+    return project_id
+
+
+# Login/Register System
+
+
+def login_register():
+    with st.sidebar:
+        st.header("🔑 Login/Register")
+        action_choice = st.radio("Choose an action", ["Login", "Register"])
+
+        if action_choice == "Login":
+            username = st.text_input("Username")
+            password = st.text_input("Password", type="password")
+            if st.button("Login"):
+                if username == "admin" and password == "admin":
+                    st.session_state.logged_in = True
+                    st.session_state.user_role = "Admin"
+                    st.session_state.username = username
+                    st.success(f"Welcome back, Admin!")
+                elif username == "user" and password == "user":
+                    st.session_state.logged_in = True
+                    st.session_state.user_role = "User"
+                    st.session_state.username = username
+                    st.success(f"Welcome back, {username}!")
+                else:
+                    st.error("Invalid credentials. Try again.")
+                    st.warning("Make sure you enter 'admin' as the username and password to test the login!")
+
+        elif action_choice == "Register":
+            new_username = st.text_input("Choose Username")
+            new_password = st.text_input("Choose Password", type="password")
+            confirm_password = st.text_input("Confirm Password", type="password")
+            if st.button("Register"):
+                if new_username and new_password == confirm_password:
+                    st.success(f"Account created successfully for {new_username}!")
+                else:
+                    st.error("Passwords do not match or fields are empty.")
+
+
+# Display Login/Register if not logged in
+
+
+if not st.session_state.logged_in:
+    login_register()
+else:
+    st.sidebar.header(f"👋 Welcome, {st.session_state.username}!")
+    if st.session_state.user_role == "Admin":
+        write_stats = repo.stats
+        st.sidebar.caption(f"Database writes: {write_stats['writes']} · no-op writes skipped: "
+                           f"{write_stats['skipped_writes']}")
+        figure_stats = figures.stats
+        st.sidebar.caption(f"Figure cache: {figure_stats['hits']} hits · {figure_stats['misses']} misses · "
+                           f"{figure_stats['entries']} figures, {figure_stats['bytes'] / 1024 ** 2:.1f} MB")
+    if st.sidebar.button("Logout"):
+        st.session_state.logged_in = False
+        st.experimental_rerun()
+
+    # Dashboard navigation; unlike st.tabs, the sections that are not selected are not run at all
+    section = option_menu(None, list(SECTIONS), icons=list(SECTIONS.values()), orientation="horizontal",
+                          key="dashboard_section")
+    # Stopped after the section below has run; a rerun cut short by an exception is not recorded
+    section_span = timings.span(f"section.{section}", **span_fields)
+
+    # Project Overview
+    if section == "Project Overview":
+        st.header("📂 Project Overview")
+        st.markdown("View and manage all your projects here.")
+        project_actions = ["Register New Project", "Bulk Import", "View Existing Projects"]
+        project_action = st.radio("Choose an action", project_actions,
+                                  index=kept_index("project_action", project_actions), **keep("project_action"))
+
+        if project_action == "Register New Project":
+            with st.form(key="project_form"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    project_name = st.text_input("Project Name")
+                    project_id = st.text_input("Project ID")
+                    client_name = st.text_input("Client Name")
+                with col2:
+                    start_date = st.date_input("Start Date")
+                    end_date = st.date_input("End Date", min_value=start_date)
+                    budget = st.number_input("Budget ($)", min_value=0, value=100000)
+
+                submit = st.form_submit_button("Register Project")
+                if submit:
+                    if not project_name or not project_id or not client_name:
+                        st.error("All fields are required!")
+                    else:
+                        new_project = {
+                            "name": project_name,
+                            "id": project_id,
+                            "client": client_name,
+                            "start_date": start_date.isoformat(),
+                            "end_date": end_date.isoformat(),
+                            "budget": budget,
+                            "progress": 0,
+                            "tasks": [],
+                            "documents": [],
+                            "interim_claims": []  # Ensure interim_claims is initialized as an empty list
+                        }
+
+                        if save_projects(repo.add_project, new_project):
+                            st.success(f"Project {project_name} registered successfully!")
+
+        elif project_action == "Bulk Import":
+            import_panel()
+
+        elif project_action == "View Existing Projects":
+            if registry:
+                selected_id = select_project("Select a Project to Track", "existing_project_select")
+                project_data = registry.get(selected_id)
+                st.write("**Project Details:**")
+                st.json(repo.load_project(selected_id))
+
+                # Option to delete project
+                if st.button("Delete Project", key=f"delete_{selected_id}"):
+                    if save_projects(repo.delete_project, selected_id, project_id=selected_id):
+                        st.success(f"Project {project_data['name']} deleted successfully!")
+            else:
+                st.info("No projects available. Please register a new project.")
+
+    # Progress Tracking
+    if section == "Progress Tracking":
+        st.header("📊 Progress Tracking")
+        st.write("Monitor project progress with interactive visuals.")
+        if registry:
+            selected_id = select_project("Select a Project to Track", "progress_tracking_select")
+            project_data = registry.get(selected_id)
+
+            progress = st.slider("Update Progress (%)", 0, 100, project_data["progress"],
+                                 key=f"progress_slider_{selected_id}")
+            # Runs on every rerun, but only a rerun where the slider moved changes the row and bumps the version
+            if save_projects(repo.set_progress, selected_id, progress, project_id=selected_id):
+                st.success(f"Updated progress for {project_data['name']} to {progress}%!")
+
+            # Display progress using a gauge chart
+            st.plotly_chart(figures.get(progress_gauge, progress))
+
+            # Display overall progress graph
+            st.subheader("Project Progress - Milestone Overview")
+            milestone_data = {
+                'Milestone': ['Planning', 'Design', 'Construction', 'Completion'],
+                'Progress': [20, 40, 60, progress]
+            }
+            st.plotly_chart(figures.get(milestone_bar, milestone_data))
+
+    # Financials
+    if section == "Financials":
+        st.header("💰 Financial Overview")
+        st.write("Track budgets and spending dynamically.")
+        if registry:
+            selected_id = select_project("Select a Project for Financials", "financials_select")
+            project_data = registry.get(selected_id)
+
+            # Spend is recorded as dated entries; each one updates the rollups read below
+            with st.expander("Record Spend"):
+                with st.form(key="spend_form", clear_on_submit=True):
+                    spend_amount = st.number_input("Spent Amount ($)", min_value=0.0, step=100.0)
+                    spent_on = st.date_input("Date Spent")
+                    spend_description = st.text_input("Description")
+                    if st.form_submit_button("Record Spend"):
+                        if spend_amount > 0:
+                            spend_entry = {"amount": spend_amount, "spent_on": spent_on,
+                                           "description": spend_description}
+                            if save_projects(repo.add_spend, selected_id, spend_entry, project_id=selected_id):
+                                st.success(f"Recorded ${spend_amount:,.2f} of spend.")
+                        else:
+                            st.error("Please enter an amount above zero.")
+
+            # Totals are precomputed, so this is a lookup however many claims the project has
+            rollups = repo.rollups()
+            totals = rollups.project(selected_id)
+            for column, (field, label) in zip(st.columns(len(ROLLUP_LABELS)), ROLLUP_LABELS.items()):
+                column.metric(label, f"${totals[field]:,.0f}")
+
+            # Display financial breakdown
+            financial_data = {
+                "Spent": totals["spent"],
+                "Remaining": totals["remaining"],
+                "Total Budget": totals["budget"]
+            }
+            st.plotly_chart(figures.get(budget_pie, financial_data))
+
+            # Portfolio-wide totals per client, and claim cash flow by month
+            st.subheader("Portfolio Financials")
+            # A snapshot of the shared totals: another session's registration or delete can change them mid-loop
+            client_rows = [dict(client=client, **client_totals)
+                           for client, client_totals in list(rollups.clients.items())]
+            client_rows.append(dict(client="Portfolio total", **rollups.portfolio))
+            st.dataframe(client_rows, hide_index=True,
+                         column_config={"client": "Client", **{field: st.column_config.NumberColumn(
+                             label, format="$%.0f") for field, label in ROLLUP_LABELS.items()}})
+            cash_flow_scopes = ["All projects", "This project"]
+            cash_flow_scope = st.radio("Cash flow for", cash_flow_scopes, horizontal=True,
+                                       index=kept_index("cash_flow_scope", cash_flow_scopes), **keep("cash_flow_scope"))
+            monthly = rollups.monthly(None if cash_flow_scope == "All projects" else selected_id)
+            if monthly:
+                st.plotly_chart(figures.get(cash_flow_bar, monthly), use_container_width=True)
+            else:
+                st.info("No interim claims to show yet.")
+
+    # Task Management
+    if section == "Task Management":
+        import pandas as pd
+        from timeline import MAX_TIMELINE_BARS, TASK_GROUPINGS, visible
+
+        st.header("📅 Task Management & Scheduling")
+        st.write("Manage and schedule tasks efficiently for each project.")
+
+        if registry:
+            selected_id = select_project("Select a Project", "task_management_select")
+            project_data = registry.get(selected_id)
+
+            # Display existing tasks, one page at a time; status is the only editable column
+            st.subheader("Current Tasks")
+            task_count = repo.count_tasks(selected_id)
+            if task_count:
+                page_count = (task_count + PAGE_SIZE - 1) // PAGE_SIZE
+                task_page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count,
+                                            value=min(kept(f"task_grid_page_{selected_id}", 1), page_count),
+                                            **keep(f"task_grid_page_{selected_id}"))
+                page_tasks = repo.list_tasks(selected_id, limit=PAGE_SIZE, offset=(task_page - 1) * PAGE_SIZE)
+                tasks_df = pd.DataFrame(page_tasks).set_index("id")
+                # The project version is part of the key so the grid starts fresh after every save
+                edited_df = st.data_editor(
+                    tasks_df, key=f"task_grid_{selected_id}_{project_data['version']}_{task_page}",
+                    hide_index=True, use_container_width=True,
+                    disabled=[column for column in tasks_df.columns if column != "status"],
+                    column_config={
+                        "task_name": "Task",
+                        "assigned_to": "Assigned To",
+                        "priority": "Priority",
+                        "start_date": "Start Date",
+                        "deadline": "Deadline",
+                        "status": st.column_config.SelectboxColumn("Status", options=TASK_STATUSES, required=True),
+                        "description": "Description",
+                    })
+                changed = edited_df["status"] != tasks_df["status"]
+                status_edits = {int(task_id): status for task_id, status in edited_df["status"][changed].items()}
+                if st.button(f"Save Status Changes ({len(status_edits)})", disabled=not status_edits):
+                    if save_projects(repo.update_task_statuses, selected_id, status_edits, project_id=selected_id):
+                        st.success(f"Updated the status of {len(status_edits)} task(s).")
+
+                # Comment threads are only loaded for the task picked here
+                st.subheader("Task Comments")
+                task_labels = {int(task_id): name for task_id, name in tasks_df["task_name"].items()}
+                comment_task_id = st.selectbox("Show comments for", list(task_labels), format_func=task_labels.get,
+                                               index=kept_index(f"comment_task_{selected_id}", task_labels),
+                                               **keep(f"comment_task_{selected_id}"))
+                for comment in repo.list_comments(comment_task_id):
+                    st.markdown(f"- {comment['body']}")
+                task_comments = st.text_area("Add a comment", key=f"comment_{comment_task_id}")
+                if st.button("Save Comment", key=f"comment_button_{comment_task_id}"):
+                    if save_projects(repo.add_comment, comment_task_id, task_comments, project_id=selected_id):
+                        st.success(f"Comment added for {task_labels[comment_task_id]}.")
+
+            else:
+                st.info("No tasks available. Please add new tasks.")
+
+            # Adding a new task
+            st.subheader("Add a New Task")
+            task_name = st.text_input("Task Name")
+            assigned_to = st.text_input("Assign to")
+            priority = st.selectbox("Priority", ["High", "Medium", "Low"])
+            task_start = st.date_input("Start Date", key="task_start_date")
+            deadline = st.date_input("Deadline", min_value=task_start)
+            description = st.text_area("Task Description")
+
+            if st.button("Add Task"):
+                if task_name and assigned_to and description:
+                    new_task = {
+                        "task_name": task_name,
+                        "assigned_to": assigned_to,
+                        "priority": priority,
+                        "start_date": task_start,
+                        "deadline": deadline,
+                        "status": "Pending",  # Default status
+                        "description": description,
+                        "comments": []  # Comments section for the task
+                    }
+                    if save_projects(repo.add_task, selected_id, new_task, project_id=selected_id):
+                        st.success(f"New task '{task_name}' added successfully!")
+                else:
+                    st.error("Please fill in all the required fields.")
+
+            # Task Search & Filter, across every project's tasks unless narrowed to this one
+            st.subheader("Search and Filter Tasks")
+            search_query = st.text_input("Search tasks by name, assignee, description or comments",
+                                         kept("task_search_query", ""), **keep("task_search_query"))
+            search_columns = st.columns(3)
+            status_filters, priority_filters = ["All"] + TASK_STATUSES, ["All", "High", "Medium", "Low"]
+            search_status = search_columns[0].selectbox("Filter by Status", status_filters,
+                                                        index=kept_index("task_search_status", status_filters),
+                                                        **keep("task_search_status"))
+            search_priority = search_columns[1].selectbox("Filter by Priority", priority_filters,
+                                                          index=kept_index("task_search_priority", priority_filters),
+                                                          **keep("task_search_priority"))
+            deadline_range = search_columns[2].date_input("Deadline Between", kept("task_search_deadline", ()),
+                                                          **keep("task_search_deadline"))
+            this_project_only = st.checkbox("This project only", kept("task_search_this_project", False),
+                                            **keep("task_search_this_project"))
+            deadline_range = list(deadline_range) + [None] * (2 - len(deadline_range))
+            found_tasks = repo.search_tasks(
+                search_query,
+                project_id=selected_id if this_project_only else None,
+                status=None if search_status == "All" else search_status,
+                priority=None if search_priority == "All" else search_priority,
+                deadline_from=deadline_range[0].isoformat() if deadline_range[0] else None,
+                deadline_to=deadline_range[1].isoformat() if deadline_range[1] else None,
+                limit=PAGE_SIZE)
+
+            if found_tasks:
+                found_frame = pd.DataFrame(found_tasks)
+                found_frame.insert(0, "project", [registry.label(project_id) if project_id in registry else project_id
+                                                  for project_id in found_frame["project_id"]])
+                columns = ["project", "task_name", "assigned_to", "priority", "deadline", "status"]
+                if search_query:
+                    columns.append("score")
+                st.caption(f"Showing the top {len(found_tasks)} matching tasks")
+                st.dataframe(found_frame[columns], hide_index=True)
+            else:
+                st.info("No tasks found matching the search query.")
+
+            # Gantt chart of this project's tasks, or of every project's start and end dates. Large
+            # schedules are grouped unless every task is asked for, which is drawn with WebGL.
+            st.subheader("Task Timeline (Gantt Chart)")
+            timeline_scopes = ["This project's tasks", "All projects"]
+            timeline_scope = st.radio("Show", timeline_scopes, horizontal=True,
+                                      index=kept_index("timeline_scope", timeline_scopes), **keep("timeline_scope"))
+            timeline_range = st.date_input("Visible Dates", kept("timeline_range", ()), **keep("timeline_range"))
+            timeline_range = list(timeline_range) + [None] * (2 - len(timeline_range))
+            if timeline_scope == "All projects":
+                timeline_fig = figures.get(portfolio_timeline_figure, repo.data_version, *timeline_range)
+            else:
+                schedule = load_task_frame(selected_id, registry.revision(selected_id))
+                visible_count = len(visible(schedule, *timeline_range))
+                group_by, every_task = next(iter(TASK_GROUPINGS)), False
+                if visible_count > MAX_TIMELINE_BARS:
+                    group_by = st.radio("Group tasks by", list(TASK_GROUPINGS), horizontal=True,
+                                        index=kept_index("timeline_group_by", TASK_GROUPINGS),
+                                        **keep("timeline_group_by"))
+                    every_task = st.checkbox(f"Draw all {visible_count:,} tasks individually",
+                                             kept("timeline_every_task", False), **keep("timeline_every_task"))
+                timeline_fig = figures.get(task_timeline_figure, selected_id, registry.revision(selected_id),
+                                           *timeline_range, group_by, every_task)
+            if timeline_fig.data:
+                st.plotly_chart(timeline_fig, use_container_width=True)
+            else:
+                st.info("Nothing with dates falls in this range.")
+
+            st.subheader("Export Tasks")
+            export_panel(selected_id, "tasks", "tasks_export")
+
+    # Documents
+    if section == "Documents":
+        st.header("📄 Document Management")
+        st.write("Upload and manage project documents.")
+
+        if registry:
+            selected_id = select_project("Select a Project for Documents", "document_management_select")
+            project_data = registry.get(selected_id)
+
+            # Show uploaded documents
+            st.subheader("Uploaded Documents")
+            documents = repo.list_documents(selected_id)
+            prepared_documents = st.session_state.setdefault("prepared_documents", [])
+            if documents:
+                for idx, doc in enumerate(documents):
+                    st.write(f"**Document {idx + 1}:** {doc['title'] or ''}")
+                    st.text(f"Filename: {doc['name']}")
+                    st.text(f"Type: {doc['type']}  ·  Size: {doc['size'] / 1024:,.1f} KB  ·  "
+                            f"Category: {doc['category'] or 'Uncategorized'}")
+                    if doc["description"]:
+                        st.caption(doc["description"])
+                    # File contents are only read when someone actually asks for them. A prepared document
+                    # keeps its download button on later reruns, including the one its own click starts;
+                    # a session keeps as many prepared as document_payload caches.
+                    if not doc["sha256"]:
+                        st.caption("File contents were not kept for this document.")
+                    elif doc["id"] in prepared_documents or st.button("Prepare Download",
+                                                                      key=f"prepare_doc_{doc['id']}"):
+                        if doc["id"] not in prepared_documents:
+                            prepared_documents.append(doc["id"])
+                            del prepared_documents[:-4]
+                        st.download_button(label="Download", data=document_payload(doc["sha256"]),
+                                           file_name=doc["name"], mime=doc["type"], key=f"download_doc_{doc['id']}")
+                    if st.button(f"Delete Document {idx + 1}", key=f"delete_doc_{doc['id']}"):
+                        if save_projects(repo.delete_document, doc["id"], project_id=selected_id):
+                            st.success(f"Document {doc['name']} deleted successfully!")
+            else:
+                st.info("No documents uploaded yet. Please upload a new document.")
+
+            # Upload multiple documents, tagged with a category and the metadata below
+            categories = ["Contracts", "Plans", "Invoices", "Reports"]
+            with st.form(key="document_upload_form", clear_on_submit=True):
+                uploaded_files = st.file_uploader("Upload Documents", type=["pdf", "docx", "png", "jpg", "jpeg"],
+                                                  accept_multiple_files=True)
+                doc_category = st.selectbox("Select Document Category", categories)
+                doc_title = st.text_input("Document Title")
+                doc_description = st.text_area("Document Description")
+                upload = st.form_submit_button("Upload Documents")
+            if upload and uploaded_files:
+                for uploaded_file in uploaded_files:  # Renaming 'file' to 'uploaded_file'
+                    # Streamed into the blob store in chunks; identical files are stored only once
+                    document_id = save_projects(repo.add_document, selected_id, uploaded_file, uploaded_file.name,
+                                                uploaded_file.type, doc_category, doc_title, doc_description,
+                                                project_id=selected_id)
+                    if document_id is None:
+                        st.info(f"{uploaded_file.name} is already stored for this project.")
+                    elif document_id:
+                        st.success(f"Document {uploaded_file.name} uploaded successfully!")
+
+            # Option to edit metadata of an uploaded document
+            if documents:
+                st.subheader("Edit Document Metadata")
+                doc_options = {doc["id"]: doc for doc in documents}
+                edit_id = st.selectbox("Select a Document", list(doc_options),
+                                       index=kept_index("document_metadata_select", doc_options),
+                                       format_func=lambda doc_id: doc_options[doc_id]["name"],
+                                       **keep("document_metadata_select"))
+                edit_doc = doc_options[edit_id]
+                edit_category = st.selectbox("Document Category", categories,
+                                             index=categories.index(edit_doc["category"])
+                                             if edit_doc["category"] in categories else 0,
+                                             key=f"doc_category_{edit_id}")
+                edit_title = st.text_input("Document Title", edit_doc["title"] or "", key=f"doc_title_{edit_id}")
+                edit_description = st.text_area("Document Description", edit_doc["description"] or "",
+                                                key=f"doc_description_{edit_id}")
+                if st.button("Save Metadata"):
+                    if edit_title and edit_description:
+                        if save_projects(repo.update_document_metadata, edit_id, edit_category, edit_title,
+                                         edit_description, project_id=selected_id):
+                            st.success("Metadata saved!")
+                    else:
+                        st.error("Please fill in both the title and description fields.")
+
+    # Interim Claims
+    if section == "Interim Claims":
+        st.header("💼 Interim Claims")
+        st.write("Manage interim claims and track payments.")
+
+        if registry:
+            selected_id = select_project("Select a Project for Interim Claims", "interim_claims_select")
+            project_data = registry.get(selected_id)
+
+            # The typed table is cached per revision, so a rerun only runs this count query
+            claim_count = repo.count_claims(selected_id)
+            claims_table = load_claims_table(selected_id, registry.revision(selected_id)) if claim_count else None
+            claim_actions = ["View Claims", "Add New Claim", "Update Claim Status"]
+            interim_claim_action = st.radio("Interim Claims Action", claim_actions,
+                                            index=kept_index("claims_action", claim_actions), **keep("claims_action"))
+
+            if interim_claim_action == "Add New Claim":
+                # Add New Claim Form
+                claim_amount = st.number_input("Claim Amount ($)", min_value=0)
+                claim_status = st.selectbox("Claim Status", ["Pending", "Approved", "Rejected"])
+                payment_schedule = st.date_input("Payment Schedule")
+                notes = st.text_area("Claim Notes", placeholder="Add any notes or comments")
+
+                if st.button("Add Claim"):
+                    if save_projects(repo.add_claim, selected_id, {
+                        "amount": claim_amount,
+                        "status": claim_status,
+                        "payment_schedule": payment_schedule.isoformat(),
+                        "notes": notes
+                    }, st.session_state.username, project_id=selected_id):
+                        st.success(f"Claim of ${claim_amount} added successfully!")
+
+            elif interim_claim_action == "View Claims":
+                # View Claims in Table Form with Search and Filter
+                if claim_count:
+                    # Filter by status, amount, or date
+                    claim_filters = ["All", "Pending", "Approved", "Rejected"]
+                    filter_status = st.selectbox("Filter by Claim Status", claim_filters,
+                                                 index=kept_index("claims_status", claim_filters),
+                                                 **keep("claims_status"))
+                    amount_col1, amount_col2 = st.columns(2)
+                    with amount_col1:
+                        min_amount = st.number_input("Minimum Amount ($)", min_value=0,
+                                                     value=kept("claims_min_amount"), **keep("claims_min_amount"))
+                    with amount_col2:
+                        max_amount = st.number_input("Maximum Amount ($)", min_value=0,
+                                                     value=kept("claims_max_amount"), **keep("claims_max_amount"))
+                    schedule_range = st.date_input("Payment Schedule Between", kept("claims_schedule_range", ()),
+                                                   **keep("claims_schedule_range"))
+
+                    # Search bar for amount or notes
+                    search_term = st.text_input("Search Claims", kept("claims_search", ""), **keep("claims_search"))
+
+                    # Sorting options
+                    sort_options = {"Claim Amount ($)": "amount", "Payment Schedule": "payment_schedule",
+                                    "Claim Status": "status"}
+                    sort_by = st.selectbox("Sort Claims By", list(sort_options),
+                                           index=kept_index("claims_sort_by", sort_options), **keep("claims_sort_by"))
+
+                    # Every filter is a vectorized operation on the cached, typed claims table
+                    claims_span = timings.span("claims.dataframe", project=selected_id, **span_fields)
+                    claims_df = claims_table.query(
+                        status=None if filter_status == "All" else filter_status, search=search_term,
+                        min_amount=min_amount, max_amount=max_amount,
+                        start=schedule_range[0] if len(schedule_range) == 2 else None,
+                        end=schedule_range[1] if len(schedule_range) == 2 else None,
+                        sort_by=sort_options[sort_by]).drop(columns="id")
+                    claims_df["payment_schedule"] = claims_df["payment_schedule"].dt.date
+                    claims_df = claims_df.rename(columns=CLAIM_LABELS)
+                    claims_df.index = range(1, len(claims_df) + 1)  # Start indexing from 1
+                    claims_span.stop()
+                    if timings.enabled:
+                        timings.count("claims_dataframe_bytes", int(claims_df.memory_usage(index=True).sum()))
+
+                    # Display the claims table, one page at a time
+                    claims_page = st.number_input("Page", min_value=1, value=kept("claims_page", 1),
+                                                  **keep("claims_page"))
+                    offset = (claims_page - 1) * PAGE_SIZE
+                    st.caption(f"Showing {len(claims_df.iloc[offset:offset + PAGE_SIZE])} of {len(claims_df)} "
+                               f"matching claims")
+                    st.dataframe(claims_df.iloc[offset:offset + PAGE_SIZE])
+
+                    # Export claims, or any other dataset, for this project or the portfolio
+                    st.subheader("Export")
+                    export_panel(selected_id, "claims", "claims_export")
+
+                else:
+                    st.info("No interim claims found for this project.")
+
+            elif interim_claim_action == "Update Claim Status":
+                # Update Existing Claim Status
+                if claim_count:
+                    # Claims are numbered in id order, which is the order of the cached table
+                    claim_idx = st.selectbox("Select a Claim to Update", range(claim_count),
+                                             format_func=lambda idx: f"Claim #{idx + 1}")
+                    selected_claim = f"Claim #{claim_idx + 1}"
+                    claim_id = int(claims_table.frame["id"].iat[claim_idx])
+                    current_status = str(claims_table.frame["status"].iat[claim_idx])
+
+                    # Allow user to update the status of the selected claim
+                    new_status = st.selectbox("Update Claim Status", ["Pending", "Approved", "Rejected"],
+                                              index=["Pending", "Approved", "Rejected"].index(current_status))
+
+                    if st.button(f"Update Status for {selected_claim}"):
+                        # Update the claim's status
+                        if save_projects(repo.update_claim_status, claim_id, new_status,
+                                         st.session_state.username, project_id=selected_id):
+                            st.success(f"The status for {selected_claim} has been updated to {new_status}.")
+                else:
+                    st.info("No interim claims found for this project.")
+
+            # Claim History or Audit Trail: every recorded change, newest first, and the claims as they
+            # stood on a chosen date, rebuilt from the nearest snapshot plus the events after it
+            if claim_count:
+                from claim_history import EVENT_KINDS, end_of_day
+
+                st.subheader("Claim History / Audit Trail")
+                history_pages = max(1, (repo.count_claim_events(selected_id) + PAGE_SIZE - 1) // PAGE_SIZE)
+                history_page = st.number_input(f"Page (of {history_pages})", min_value=1, max_value=history_pages,
+                                               value=min(kept(f"claim_history_page_{selected_id}", 1), history_pages),
+                                               **keep(f"claim_history_page_{selected_id}"))
+                events = repo.list_claim_events(selected_id, limit=PAGE_SIZE, offset=(history_page - 1) * PAGE_SIZE)
+                st.dataframe([dict(event, kind=EVENT_KINDS[event["kind"]]) for event in events], hide_index=True,
+                             column_order=list(CLAIM_EVENT_LABELS), column_config=CLAIM_EVENT_LABELS)
+
+                as_of = st.date_input("Claims as of", kept(f"claims_as_of_{selected_id}"),
+                                      **keep(f"claims_as_of_{selected_id}"))
+                if as_of is not None:
+                    claims_then = repo.claims_as_of(selected_id, end_of_day(as_of))
+                    total = sum(claim["amount"] or 0 for claim in claims_then)
+                    st.caption(f"{len(claims_then)} claims totalling ${total:,.2f} "
+                               f"at the end of {as_of:%d %B %Y} (UTC)")
+                    st.dataframe(claims_then, hide_index=True, column_order=list(CLAIM_LABELS),
+                                 column_config=CLAIM_LABELS)
+
+    # Remember the versions this run displayed, for the conflict check on the next interaction
+    for shown_id in shown_projects:
+        if shown_id in repo.registry:
+            seen_versions[shown_id] = repo.registry.get(shown_id)["version"]
+
+    section_span.stop()
+
+    # Admin-only timing panel, drawn last so it includes this rerun
+    if st.session_state.user_role == "Admin":
+        timing_panel()
@@ -0,0 +1,419 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import repository  # noqa: E402
+from repository import ProjectRepository  # noqa: E402
+
+APP_PATH = os.path.join(ROOT, "App.py")
+CLIENTS = ["Acme Developments", "Harbour City Council", "Northgate Holdings", "Riverside Schools", "Summit Health"]
+TRADES = ["excavation", "foundation", "concrete", "formwork", "steel", "roofing", "plumbing", "electrical", "hvac"]
+AREAS = ["level", "basement", "podium", "tower", "carpark", "lobby", "facade", "core", "stair", "plantroom"]
+PEOPLE = ["amara", "bongani", "chen", "dimitri", "elif", "fatima", "gareth", "hiro", "ines", "jabu"]
+NOTES = ["Foundation works", "Steel frame delivery", "Retention release", "Variation order", "Site clearance"]
+CATEGORIES = ["Contracts", "Plans", "Invoices", "Reports"]
+# Repository methods App.save_projects() hands writes to, and the ones behind App.load_projects()
+SAVE_METHODS = ["add_project", "delete_project", "set_progress", "add_task", "update_task_statuses", "add_comment",
+                "add_claim", "update_claim_status", "add_spend", "add_document", "update_document_metadata",
+                "delete_document", "bulk_import"]
+LOAD_METHODS = ["refresh"]
+# Relative slowdown of a step's median rerun that --compare reports as a regression
+REGRESSION_THRESHOLD = 0.2
+
+
+# Synthetic portfolio: projects x tasks x claims, with comments, spend and document metadata
+
+
+def make_projects(count, rng):
+    start = date(2023, 1, 1)
+    for number in range(count):
+        begins = start + timedelta(days=rng.randrange(365))
+        yield {
+            "id": f"P{number:05d}",
+            "name": f"{rng.choice(AREAS).title()} {rng.choice(TRADES).title()} Package {number}",
+            "client": rng.choice(CLIENTS),
+            "start_date": begins.isoformat(),
+            "end_date": (begins + timedelta(days=rng.randrange(180, 900))).isoformat(),
+            "budget": float(rng.randrange(500_000, 50_000_000)),
+            "progress": rng.randrange(101),
+        }
+
+
+def make_tasks(project, count, rng):
+    start = date.fromisoformat(project["start_date"])
+    for number in range(count):
+        begins = start + timedelta(days=rng.randrange(365))
+        trade, area = rng.choice(TRADES), rng.choice(AREAS)
+        yield {
+            "project_id": project["id"],
+            "task_name": f"{trade} {area} {number}",
+            "assigned_to": rng.choice(PEOPLE),
+            "priority": rng.choice(["High", "Medium", "Low"]),
+            "start_date": begins.isoformat(),
+            "deadline": (begins + timedelta(days=rng.randrange(1, 60))).isoformat(),
+            "status": rng.choice(["Pending", "In Progress", "Completed"]),
+            "description": f"{trade} works for {area} ref RFI{rng.randrange(100000)}",
+        }
+
+
+def make_claims(project, count, rng):
+    start = date.fromisoformat(project["start_date"])
+    for number in range(count):
+        yield {
+            "project_id": project["id"],
+            "amount": float(rng.randrange(1000, 500000)),
+            "status": rng.choice(["Pending", "Approved", "Rejected"]),
+            "payment_schedule": (start + timedelta(days=rng.randrange(730))).isoformat(),
+            "notes": f"{rng.choice(NOTES)} #{number}",
+        }
+
+
+# Write the synthetic portfolio into the repository in `directory`. Projects, tasks and claims go
+# through bulk_import; comments and spend are inserted in one transaction; every document is a
+# small distinct file so each one lands in the blob store.
+
+
+def seed_portfolio(directory, projects, tasks, claims, comments, documents, seed=42):
+    rng = random.Random(seed)
+    repo = repository.open_repository(*(os.path.join(directory, name) for name in (
+        repository.DATABASE_PATH, repository.SNAPSHOT_PATH, repository.JOURNAL_PATH, repository.BLOB_DIR)))
+    portfolio = list(make_projects(projects, rng))
+    repo.bulk_import("projects", [portfolio])
+    repo.bulk_import("tasks", (list(make_tasks(project, tasks, rng)) for project in portfolio))
+    repo.bulk_import("claims", (list(make_claims(project, claims, rng)) for project in portfolio))
+    task_ids = [row[0] for row in repo.conn.execute("SELECT id FROM tasks")]
+    with repo.conn:
+        repo.conn.executemany("INSERT INTO comments (task_id, body) VALUES (?, ?)", [
+            (task_id, f"checked by {rng.choice(PEOPLE)}") for task_id in task_ids for _ in range(comments)])
+        repo.conn.executemany("INSERT INTO spend_entries (project_id, amount, spent_on, description) "
+                              "VALUES (?, ?, ?, ?)", [
+                                  (project["id"], float(rng.randrange(1000, 200000)), project["start_date"],
+                                   rng.choice(NOTES)) for project in portfolio for _ in range(max(claims // 2, 1))])
+    for project in portfolio:
+        for number in range(documents):
+            content = f"{project['id']} document {number}\n".encode() * 64
+            repo.add_document(project["id"], io.BytesIO(content), f"{project['id']}-{number}.pdf", "application/pdf",
+                              rng.choice(CATEGORIES), f"Document {number}", f"Synthetic document {number}")
+    repo.close()
+
+
+# Time, call count and bytes written by the repository methods behind load_projects/save_projects.
+# The app runs in this process, so the methods are wrapped on the class for the whole benchmark.
+
+
+class RepositoryProbe:
+    def __init__(self):
+        self.originals = {}
+        self.reset()
+
+    def reset(self):
+        self.totals = {"load_ms": 0.0, "load_calls": 0, "save_ms": 0.0, "save_calls": 0, "save_bytes": 0}
+
+    def install(self):
+        for kind, names in (("load", LOAD_METHODS), ("save", SAVE_METHODS)):
+            for name in names:
+                self.originals[name] = getattr(ProjectRepository, name)
+                setattr(ProjectRepository, name, self._wrap(kind, self.originals[name]))
+        self.originals["open_repository"] = repository.open_repository
+        repository.open_repository = self._wrap("load", repository.open_repository)
+
+    def uninstall(self):
+        repository.open_repository = self.originals.pop("open_repository")
+        for name, method in self.originals.items():
+            setattr(ProjectRepository, name, method)
+        self.originals = {}
+
+    def _wrap(self, kind, method):
+        def wrapper(*args, **kwargs):
+            written, started = bytes_written(), time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.totals[f"{kind}_ms"] += (time.perf_counter() - started) * 1000
+                self.totals[f"{kind}_calls"] += 1
+                if kind == "save" and written is not None:
+                    self.totals["save_bytes"] += bytes_written() - written
+        return wrapper
+
+
+# Bytes this process has passed to write() so far, or None where /proc is not available
+
+
+def bytes_written():
+    try:
+        with open("/proc/self/io") as io_stats:
+            return next(int(line.split()[1]) for line in io_stats if line.startswith("wchar:"))
+    except OSError:
+        return None
+
+
+# Current resident set size in MB, or None where /proc is not available. ru_maxrss would only ever
+# report the process-wide high-water mark, which cannot be attributed to a single step.
+
+
+def resident_mb():
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+
+
+# AppTest widget lookups. Widgets without a key are found by their label.
+
+
+def widget(at, kind, label=None, key_prefix=None):
+    for element in getattr(at, kind):
+        if label is not None and element.label != label:
+            continue
+        if key_prefix is None or str(element.key).startswith(key_prefix):
+            return element
+    raise LookupError(f"No {kind} {label or key_prefix!r} on the page")
+
+
+def button(at, label):
+    return next(element for element in at.button if element.label.startswith(label))
+
+
+# The tour: every section, then the actions within it. Each action sets widgets on the page the
+# previous rerun left behind; the rerun that follows is what gets timed.
+
+
+def fill_task(at):
+    widget(at, "text_input", "Task Name").input("Benchmark task")
+    widget(at, "text_input", "Assign to").input("bench")
+    widget(at, "text_area", "Task Description").input("Added by the benchmark")
+    button(at, "Add Task").click()
+
+
+def fill_comment(at):
+    widget(at, "text_area", "Add a comment").input("Benchmark comment")
+    button(at, "Save Comment").click()
+
+
+def fill_spend(at):
+    widget(at, "number_input", "Spent Amount ($)").set_value(1500.0)
+    widget(at, "text_input", "Description").input("Benchmark spend")
+    button(at, "Record Spend").click()
+
+
+def fill_metadata(at):
+    widget(at, "text_input", "Document Title", "doc_title_").input(f"Revised {time.time():.0f}")
+    button(at, "Save Metadata").click()
+
+
+def fill_claim(at):
+    widget(at, "number_input", "Claim Amount ($)").set_value(2500)
+    widget(at, "text_area", "Claim Notes").input("Benchmark claim")
+    button(at, "Add Claim").click()
+
+
+def fill_claim_status(at):
+    current = widget(at, "selectbox", "Update Claim Status")
+    current.set_value("Approved" if current.value != "Approved" else "Pending")
+    button(at, "Update Status for").click()
+
+
+TOUR = {
+    "Project Overview": [
+        ("view projects", lambda at: widget(at, "radio", "Choose an action").set_value("View Existing Projects")),
+    ],
+    "Progress Tracking": [
+        ("update progress", lambda at: widget(at, "slider", key_prefix="progress_slider_").set_value(
+            (widget(at, "slider", key_prefix="progress_slider_").value + 7) % 101)),
+    ],
+    "Financials": [
+        ("record spend", fill_spend),
+        ("project cash flow", lambda at: widget(at, "radio", key_prefix="cash_flow_scope").set_value("This project")),
+    ],
+    "Task Management": [
+        ("next task page", lambda at: widget(at, "number_input", key_prefix="task_grid_page_").increment()),
+        ("add comment", fill_comment),
+        ("add task", fill_task),
+        ("search tasks", lambda at: widget(
+            at, "text_input", "Search tasks by name, assignee, description or comments").input("concrete podium")),
+        ("portfolio gantt", lambda at: widget(at, "radio", key_prefix="timeline_scope").set_value("All projects")),
+    ],
+    "Documents": [
+        ("edit metadata", fill_metadata),
+    ],
+    "Interim Claims": [
+        ("search claims", lambda at: widget(at, "text_input", "Search Claims").input("Steel")),
+        ("open add claim", lambda at: widget(at, "radio", "Interim Claims Action").set_value("Add New Claim")),
+        ("add claim", fill_claim),
+        ("open update status", lambda at: widget(at, "radio", "Interim Claims Action").set_value(
+            "Update Claim Status")),
+        ("update claim status", fill_claim_status),
+    ],
+}
+
+
+# AppTest does not keep a custom component's value between reruns, so the option_menu section is
+# set again before every one
+
+
+def timed_rerun(at, section, probe, timeout):
+    at.session_state["dashboard_section"] = section
+    probe.reset()
+    resident_before, started = resident_mb(), time.perf_counter()
+    at.run(timeout=timeout)
+    elapsed = (time.perf_counter() - started) * 1000
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    resident = resident_mb()
+    growth = None if resident is None else resident - resident_before
+    return dict(rerun_ms=elapsed, rss_mb=resident, rss_delta_mb=growth, **probe.totals)
+
+
+# One logged-in session through the whole tour; returns {step: measurement}
+
+
+def run_tour(probe, timeout):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.session_state["logged_in"] = True
+    at.session_state["user_role"] = "Admin"
+    at.session_state["username"] = "admin"
+    samples = {"start": timed_rerun(at, next(iter(TOUR)), probe, timeout)}
+    for section, actions in TOUR.items():
+        samples[f"{section} / open"] = timed_rerun(at, section, probe, timeout)
+        for action, apply in actions:
+            apply(at)
+            samples[f"{section} / {action}"] = timed_rerun(at, section, probe, timeout)
+    return samples
+
+
+# Memory figures are None on platforms without /proc
+
+
+def _rounded(aggregate, values):
+    return None if None in values else round(aggregate(values), 1)
+
+
+# Per step: the first (cold) tour, the median over the rest, and resident memory after the step and
+# its growth during the step
+
+
+def summarize(tours):
+    steps = {}
+    for step in tours[0]:
+        samples = [tour[step] for tour in tours]
+        warm = samples[1:] or samples
+        steps[step] = {
+            "cold_rerun_ms": round(samples[0]["rerun_ms"], 2),
+            "rerun_ms": round(statistics.median(sample["rerun_ms"] for sample in warm), 2),
+            "max_rerun_ms": round(max(sample["rerun_ms"] for sample in warm), 2),
+            "rss_mb": _rounded(max, [sample["rss_mb"] for sample in samples]),
+            "cold_rss_delta_mb": _rounded(sum, [samples[0]["rss_delta_mb"]]),
+            "rss_delta_mb": _rounded(statistics.median, [sample["rss_delta_mb"] for sample in warm]),
+            **{field: round(statistics.median(sample[field] for sample in warm), 2)
+               for field in ("load_ms", "load_calls", "save_ms", "save_calls", "save_bytes")},
+        }
+    return steps
+
+
+# Steps whose median rerun (or save) time grew by more than `threshold` against a baseline report
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    for step, current in report["steps"].items():
+        previous = baseline["steps"].get(step)
+        if previous is None:
+            continue
+        for field in ("rerun_ms", "save_ms"):
+            # Sub-millisecond timings are mostly noise
+            if previous[field] >= 1 and current[field] > previous[field] * (1 + threshold):
+                regressions.append((step, field, previous[field], current[field]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rerun latency and storage I/O of App.py on a synthetic portfolio")
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=200, help="tasks per project")
+    parser.add_argument("--claims", type=int, default=40, help="claims per project")
+    parser.add_argument("--comments", type=int, default=1, help="comments per task")
+    parser.add_argument("--documents", type=int, default=3, help="documents per project")
+    parser.add_argument("--repeat", type=int, default=3, help="tours of the app; the first one is cold")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds allowed per rerun")
+    parser.add_argument("--output", default="bench_app.json")
+    parser.add_argument("--compare", help="earlier report to check this run against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+    portfolio = {field: getattr(args, field) for field in ("projects", "tasks", "claims", "comments", "documents")}
+
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        seed_portfolio(directory, **portfolio)
+        seed_seconds = time.perf_counter() - started
+        database_bytes = os.path.getsize(os.path.join(directory, repository.DATABASE_PATH))
+        print(f"Seeded {args.projects:,} projects x {args.tasks:,} tasks x {args.claims:,} claims "
+              f"({database_bytes / 1024 ** 2:.1f} MB) in {seed_seconds:.1f} s")
+
+        # The app opens its database relative to the working directory
+        working_directory = os.getcwd()
+        os.chdir(directory)
+        probe = RepositoryProbe()
+        probe.install()
+        try:
+            import streamlit as st
+            st.cache_resource.clear()
+            tours = [run_tour(probe, args.timeout) for _ in range(args.repeat)]
+        finally:
+            probe.uninstall()
+            os.chdir(working_directory)
+
+    import streamlit
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "streamlit": streamlit.__version__,
+        "portfolio": portfolio,
+        "repeat": args.repeat,
+        "seed_seconds": round(seed_seconds, 2),
+        "database_bytes": database_bytes,
+        "steps": summarize(tours),
+    }
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    print(f"{'step':<40} {'cold ms':>9} {'rerun ms':>9} {'load ms':>8} {'save ms':>8} {'saved KB':>9} {'RSS MB':>7} "
+          f"{'+MB cold':>8} {'+MB':>6}")
+    for step, result in report["steps"].items():
+        memory = [result["rss_mb"], result["cold_rss_delta_mb"], result["rss_delta_mb"]]
+        rss, cold_growth, growth = ("n/a" if value is None else f"{value:.1f}" for value in memory)
+        print(f"{step:<40} {result['cold_rerun_ms']:9.1f} {result['rerun_ms']:9.1f} {result['load_ms']:8.1f} "
+              f"{result['save_ms']:8.1f} {result['save_bytes'] / 1024:9.1f} {rss:>7} {cold_growth:>8} {growth:>6}")
+    print(f"Report written to {output}")
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        for step, field, previous, current in regressions:
+            print(f"REGRESSION {step}: {field} {previous:.1f} -> {current:.1f} "
+                  f"(+{(current / previous - 1) * 100:.0f}%)")
+        if regressions:
+            sys.exit(1)
+        print(f"No step regressed by more than {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
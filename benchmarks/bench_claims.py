@@ -0,0 +1,76 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from claims import ClaimsTable  # noqa: E402
+
+STATUSES = ["Pending", "Approved", "Rejected"]
+NOTES = ["Foundation works", "Steel frame delivery", "Retention release", "Variation order", "Site clearance", ""]
+
+
+# Synthetic claims shaped like repository.list_claims() rows
+
+
+def make_claims(count, seed=42):
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    return [{
+        "id": claim_id,
+        "amount": float(rng.randrange(1000, 500000)),
+        "status": rng.choice(STATUSES),
+        "payment_schedule": (start + timedelta(days=rng.randrange(730))).isoformat(),
+        "notes": f"{rng.choice(NOTES)} #{claim_id}",
+    } for claim_id in range(1, count + 1)]
+
+
+# The View Claims code path before the claims table: per-row lambda search, then a full sort
+
+
+def legacy_query(claims, search_term, status):
+    claims_df = pd.DataFrame(claims).drop(columns="id")
+    if status:
+        claims_df = claims_df[claims_df["status"] == status]
+    claims_df = claims_df[claims_df.apply(lambda row: row.astype(str).str.contains(search_term).any(), axis=1)]
+    return claims_df.sort_values(by="amount", ascending=True)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the legacy claims search with ClaimsTable")
+    parser.add_argument("--claims", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--legacy-repeat", type=int, default=1, help="the legacy path takes seconds per run")
+    args = parser.parse_args()
+
+    claims = make_claims(args.claims)
+    build_time, table = timed(lambda: ClaimsTable(claims), args.repeat)
+    print(f"{args.claims:,} claims; ClaimsTable build (once per project version): {build_time * 1000:.1f} ms")
+
+    cases = [("search 'Steel'", "Steel", None), ("search + status", "Variation", "Approved"),
+             ("search by amount", "4500", None)]
+    for label, search_term, status in cases:
+        legacy_time, legacy_rows = timed(lambda: legacy_query(claims, search_term, status), args.legacy_repeat)
+        table_time, table_rows = timed(lambda: table.query(status=status, search=search_term), args.repeat)
+        print(f"{label:<18} legacy {legacy_time * 1000:9.1f} ms ({len(legacy_rows):,} rows)   "
+              f"ClaimsTable {table_time * 1000:7.1f} ms ({len(table_rows):,} rows)   "
+              f"speedup {legacy_time / table_time:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
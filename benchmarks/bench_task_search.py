@@ -0,0 +1,77 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import TaskSearchIndex  # noqa: E402
+
+TRADES = ["excavation", "foundation", "concrete", "formwork", "rebar", "steel", "framing", "roofing", "glazing",
+          "plumbing", "electrical", "hvac", "drywall", "painting", "flooring", "landscaping", "paving", "survey"]
+ACTIONS = ["install", "inspect", "pour", "order", "deliver", "review", "approve", "repair", "test", "commission"]
+AREAS = ["level", "basement", "podium", "tower", "carpark", "lobby", "facade", "core", "stair", "plantroom"]
+PEOPLE = ["amara", "bongani", "chen", "dimitri", "elif", "fatima", "gareth", "hiro", "ines", "jabu", "kofi", "lena"]
+STATUSES = ["Pending", "In Progress", "Completed"]
+PRIORITIES = ["High", "Medium", "Low"]
+
+
+# Synthetic tasks spread over many projects, with a long tail of unique reference numbers
+
+
+def make_tasks(count, projects, seed=7):
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    for task_id in range(1, count + 1):
+        trade, action, area = rng.choice(TRADES), rng.choice(ACTIONS), rng.choice(AREAS)
+        yield {
+            "id": task_id,
+            "project_id": f"P{rng.randrange(projects):05d}",
+            "task_name": f"{action} {trade} {area} {rng.randrange(1, 40)}",
+            "assigned_to": f"{rng.choice(PEOPLE)} {rng.choice(PEOPLE)}son",
+            "priority": rng.choice(PRIORITIES),
+            "deadline": (start + timedelta(days=rng.randrange(1000))).isoformat(),
+            "status": rng.choice(STATUSES),
+            "description": f"{trade} works for {area} ref RFI{rng.randrange(100000)}",
+            "comments": [f"checked by {rng.choice(PEOPLE)}"] if rng.random() < 0.3 else [],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query latency of TaskSearchIndex")
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--projects", type=int, default=2_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = TaskSearchIndex(make_tasks(args.tasks, args.projects))
+    print(f"Indexed {len(index):,} tasks ({len(index.vocab):,} distinct tokens) "
+          f"in {time.perf_counter() - started:.1f} s")
+
+    queries = [
+        ("rare reference", {"query": "rfi4242"}),
+        ("two words", {"query": "concrete podium"}),
+        ("three words", {"query": "pour concrete basement"}),
+        ("prefix", {"query": "plumb"}),
+        ("typo", {"query": "electricl"}),
+        ("name + filters", {"query": "roofing", "status": "Pending", "priority": "High"}),
+        ("assignee + deadline range", {"query": "fatima", "deadline_from": "2024-06-01",
+                                       "deadline_to": "2024-06-30"}),
+        ("project only", {"project_id": "P00042"}),
+        ("deadline range only", {"deadline_from": "2025-03-01", "deadline_to": "2025-03-07"}),
+    ]
+    for label, params in queries:
+        samples = []
+        for _ in range(args.repeat):
+            query_started = time.perf_counter()
+            results = index.search(**params)
+            samples.append(time.perf_counter() - query_started)
+        print(f"{label:<28} median {statistics.median(samples) * 1000:7.1f} ms   {len(results)} results")
+
+
+if __name__ == "__main__":
+    main()
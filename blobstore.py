@@ -0,0 +1,69 @@
+import hashlib
+import mmap
+import os
+import tempfile
+
+BLOB_DIR = "blobs"
+# Uploads are hashed and written this many bytes at a time
+CHUNK_SIZE = 1024 * 1024
+
+
+# Content-addressed file store
+#
+# Each blob lives at <root>/<first two hex digits>/<sha256>, so identical files uploaded to
+# different projects are stored once. Writes go to a temp file in the same directory tree and are
+# renamed into place only once complete, so a reader never sees a partial blob.
+
+
+class BlobStore:
+    def __init__(self, root=BLOB_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    # Copy a readable binary stream into the store chunk by chunk; returns (sha256, size)
+
+    def put_stream(self, stream, chunk_size=CHUNK_SIZE):
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in iter(lambda: stream.read(chunk_size), b""):
+                    sha256.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+                file.flush()
+                os.fsync(file.fileno())
+            digest = sha256.hexdigest()
+            if self.exists(digest):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(self.path(digest)), exist_ok=True)
+                os.replace(tmp_path, self.path(digest))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest, size
+
+    # Read-only memory map of a blob; the pages come from the OS cache rather than the Python heap.
+    # Use it as a context manager so the mapping is released.
+
+    def open_mapped(self, digest):
+        with open(self.path(digest), "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                # Empty files cannot be mapped
+                return memoryview(b"")
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
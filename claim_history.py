@@ -0,0 +1,41 @@
+import json
+from datetime import datetime, timezone
+
+# A project's claim state is snapshotted after this many events since its last snapshot
+CLAIM_SNAPSHOT_EVERY = 500
+# Every event carries the claim as it stood after the change, so replay is "last event wins"
+CLAIM_STATE_COLUMNS = ["amount", "status", "payment_schedule", "notes"]
+EVENT_KINDS = {"created": "Created", "status": "Status changed"}
+
+
+# Event and snapshot times are UTC ISO strings, so they sort and compare as text
+
+
+def timestamp(moment=None):
+    return (moment or datetime.now(timezone.utc)).strftime("%Y-%m-%dT%H:%M:%S.%f")
+
+
+# Latest moment of a calendar day, for "as of <date>" queries
+
+
+def end_of_day(day):
+    return f"{day.isoformat()}T23:59:59.999999"
+
+
+def encode_snapshot(claims):
+    return json.dumps([[claim["id"]] + [claim[column] for column in CLAIM_STATE_COLUMNS] for claim in claims],
+                      separators=(",", ":"))
+
+
+def decode_snapshot(payload):
+    return {row[0]: dict(zip(CLAIM_STATE_COLUMNS, row[1:])) for row in json.loads(payload)}
+
+
+# Apply events (rows with claim_id plus CLAIM_STATE_COLUMNS, oldest first) on top of a snapshot
+# from decode_snapshot, and return the claims in id order in the shape list_claims() uses
+
+
+def replay(state, events):
+    for event in events:
+        state[event["claim_id"]] = {column: event[column] for column in CLAIM_STATE_COLUMNS}
+    return [dict(id=claim_id, **state[claim_id]) for claim_id in sorted(state)]
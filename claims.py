@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+CLAIM_FIELDS = ["id", "amount", "status", "payment_schedule", "notes"]
+SORT_COLUMNS = ["amount", "payment_schedule", "status"]
+
+
+# Typed, columnar view of one project's interim claims
+#
+# Built once per project version: amount is float64, payment_schedule a datetime, status a
+# categorical and notes an Arrow-backed string. Every claim also gets one lower-cased search_text
+# string covering all of its fields, so a search is a single vectorized contains. The sort order of
+# each sortable column is computed up front; a query only masks that order instead of re-sorting.
+
+
+class ClaimsTable:
+    def __init__(self, rows):
+        raw = pd.DataFrame(rows, columns=CLAIM_FIELDS)
+        frame = pd.DataFrame({
+            "id": raw["id"].astype("int64"),
+            "amount": pd.to_numeric(raw["amount"], errors="coerce").astype("float64"),
+            "status": raw["status"].astype("category"),
+            "payment_schedule": pd.to_datetime(raw["payment_schedule"], errors="coerce"),
+            "notes": raw["notes"].fillna("").astype("string[pyarrow]"),
+        })
+        frame["search_text"] = (
+            frame["amount"].astype("string").fillna("") + " " + raw["status"].fillna("") + " "
+            + raw["payment_schedule"].fillna("") + " " + frame["notes"]
+        ).str.lower().astype("string[pyarrow]")
+        self.frame = frame
+        # Rows arrive ordered by id, so a stable sort keeps insertion order among equal keys
+        self._orders = {
+            "amount": np.argsort(frame["amount"].to_numpy(), kind="stable"),
+            "payment_schedule": np.argsort(frame["payment_schedule"].to_numpy(), kind="stable"),
+            "status": np.argsort(frame["status"].cat.codes.to_numpy(), kind="stable"),
+        }
+
+    def __len__(self):
+        return len(self.frame)
+
+    # Filter and sort; every condition is a whole-column operation combined into one mask
+
+    def query(self, status=None, search="", min_amount=None, max_amount=None, start=None, end=None,
+              sort_by="amount"):
+        frame = self.frame
+        mask = np.ones(len(frame), dtype=bool)
+        if status:
+            mask &= (frame["status"] == status).to_numpy()
+        if search:
+            matches = frame["search_text"].str.contains(search.lower(), regex=False)
+            mask &= matches.to_numpy(dtype=bool, na_value=False)
+        if min_amount is not None:
+            mask &= (frame["amount"] >= min_amount).to_numpy()
+        if max_amount is not None:
+            mask &= (frame["amount"] <= max_amount).to_numpy()
+        if start is not None:
+            mask &= (frame["payment_schedule"] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (frame["payment_schedule"] <= pd.Timestamp(end)).to_numpy()
+        order = self._orders[sort_by]
+        return frame.take(order[mask[order]]).drop(columns="search_text")
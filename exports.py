@@ -0,0 +1,183 @@
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Rows fetched from the database and written out per step
+EXPORT_CHUNK_ROWS = 10_000
+# Temp file names of exports start with this; files untouched for EXPORT_TTL_SECONDS are removed
+EXPORT_PREFIX = "civitas_"
+EXPORT_TTL_SECONDS = 60 * 60
+EXPORT_DATASETS = {"claims": "Interim claims", "tasks": "Tasks", "projects": "Project summaries"}
+# Format label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "JSON Lines": (".jsonl", "application/x-ndjson"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+# Parquet column types per dataset; columns not listed are written as strings
+PARQUET_TYPES = {
+    "claims": {"id": "int64", "amount": "float64"},
+    "tasks": {"id": "int64"},
+    "projects": {"budget": "float64", "progress": "int64", "version": "int64", "tasks": "int64",
+                 "completed_tasks": "int64", "spent": "float64", "claimed": "float64", "approved": "float64"},
+}
+
+
+# One writer per format: write(columns, rows) is called once per chunk, then close()
+
+
+class CsvWriter:
+    def __init__(self, path, dataset):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.header_written = False
+
+    def write(self, columns, rows):
+        if not self.header_written:
+            self.writer.writerow(columns)
+            self.header_written = True
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesWriter:
+    def __init__(self, path, dataset):
+        self.file = open(path, "w", encoding="utf-8")
+        self.encode = json.JSONEncoder(default=str).encode
+
+    def write(self, columns, rows):
+        encode = self.encode
+        self.file.writelines(encode(dict(zip(columns, row))) + "\n" for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, dataset):
+        self.path = path
+        self.types = PARQUET_TYPES[dataset]
+        self.writer = None
+
+    def write(self, columns, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self.writer is None:
+            self.schema = pa.schema([(column, getattr(pa, self.types.get(column, "string"))())
+                                     for column in columns])
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        # Each chunk becomes one row group, so only one chunk is ever held in memory
+        arrays = []
+        for position, column in enumerate(columns):
+            values = [row[position] for row in rows]
+            if column not in self.types:
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(values)
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+WRITERS = {"CSV": CsvWriter, "JSON Lines": JsonLinesWriter, "Parquet": ParquetWriter}
+
+
+# Export of one dataset, for one project or the whole portfolio, run on a background thread
+#
+# Rows are read through the repository's separate read-only connection in EXPORT_CHUNK_ROWS
+# chunks and appended to a temp file, so neither the UI thread nor the repository lock is held up
+# and memory use does not grow with the export. `written`/`total` report progress; once `done`,
+# `path` holds the finished file unless `error` is set. discard() stops the export and deletes
+# the file.
+
+
+class ExportJob:
+    def __init__(self, repo, dataset, export_format, project_id=None, chunk_size=EXPORT_CHUNK_ROWS):
+        self.dataset = dataset
+        self.export_format = export_format
+        self.project_id = project_id
+        self.chunk_size = chunk_size
+        self.sql, self.params = repo.export_query(dataset, project_id)
+        self.written = 0
+        self.total = None
+        self.done = False
+        self.error = None
+        self._cancelled = threading.Event()
+        extension, self.mime_type = EXPORT_FORMATS[export_format]
+        remove_stale_exports()
+        fd, self.path = tempfile.mkstemp(prefix=f"{EXPORT_PREFIX}{dataset}_", suffix=extension)
+        os.close(fd)
+        self.file_name = f"{dataset}_{project_id or 'portfolio'}{extension}"
+        self._thread = threading.Thread(target=self._run, args=(repo.open_reader(),), daemon=True)
+        self._thread.start()
+
+    # Finished without error and the file is still there (remove_stale_exports may have taken it)
+
+    @property
+    def available(self):
+        return self.done and self.error is None and os.path.exists(self.path)
+
+    @property
+    def progress(self):
+        if self.done:
+            return 1.0
+        return min(self.written / self.total, 1.0) if self.total else 0.0
+
+    def _run(self, conn):
+        writer = None
+        try:
+            self.total = conn.execute(f"SELECT COUNT(*) FROM ({self.sql})", self.params).fetchone()[0]
+            writer = WRITERS[self.export_format](self.path, self.dataset)
+            cursor = conn.execute(self.sql, self.params)
+            columns = [description[0] for description in cursor.description]
+            while not self._cancelled.is_set():
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                writer.write(columns, rows)
+                self.written += len(rows)
+            if self.written == 0:
+                writer.write(columns, [])
+        except Exception as e:
+            self.error = e
+        finally:
+            if writer is not None:
+                writer.close()
+            conn.close()
+            self.done = True
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return self.done
+
+    def discard(self):
+        self._cancelled.set()
+        self._thread.join()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# Delete export files in the temp directory that have not been written for `max_age` seconds: the
+# exports of sessions that were closed or never downloaded them. Returns how many were removed.
+
+
+def remove_stale_exports(max_age=EXPORT_TTL_SECONDS):
+    directory, cutoff, removed = tempfile.gettempdir(), time.time() - max_age, 0
+    for name in os.listdir(directory):
+        if not name.startswith(EXPORT_PREFIX) or not name.endswith(tuple(ext for ext, _ in EXPORT_FORMATS.values())):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            # Removed by another process in the meantime, or not ours to remove
+            pass
+    return removed
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+# Built figures are kept until their serialized specs add up to this many bytes
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def _canonical(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    # DataFrames and Series: hash the values and index rather than serializing every row
+    if hasattr(value, "to_numpy") and hasattr(value, "index"):
+        import pandas as pd
+        return [list(map(str, getattr(value, "columns", []))),
+                int(pd.util.hash_pandas_object(value, index=True).sum())]
+    return str(value)
+
+
+# Stable digest of a chart's kind and inputs; inputs may be any JSON-like structure, dates or
+# pandas objects
+
+
+def fingerprint(kind, inputs):
+    payload = json.dumps([kind, inputs], sort_keys=True, default=_canonical, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Process-wide memo of Plotly figures keyed by the fingerprint of what they were built from
+#
+# get(build, *inputs) is build(*inputs), remembered under the builder's name and inputs, so a
+# builder must depend on nothing but its arguments. A hit returns the figure built earlier and
+# moves it to the recently used end. Entries are evicted least recently used first once the total
+# size of their JSON specs - roughly what st.plotly_chart sends to the browser - goes over
+# `max_bytes`. The newest figure is always kept, even when it alone is over budget. Figures are
+# shared between sessions, so callers must not modify them.
+
+
+class FigureCache:
+    def __init__(self, max_bytes=FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        # Spec bytes of every figure handed out, hits included
+        self.served_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, build, *inputs):
+        key = fingerprint(f"{build.__module__}.{build.__qualname__}", inputs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.served_bytes += entry[1]
+                return entry[0]
+            self.misses += 1
+        # Built outside the lock so one slow chart does not hold up the other sessions
+        figure = build(*inputs)
+        size = len(figure.to_json())
+        with self._lock:
+            self.served_bytes += size
+            if key not in self._entries:
+                self._entries[key] = (figure, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes and len(self._entries) > 1:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self.bytes -= evicted_size
+                    self.evictions += 1
+        return figure
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    @property
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "served_bytes": self.served_bytes,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
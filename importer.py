@@ -0,0 +1,230 @@
+import os
+import sys
+
+from jsonschema import Draft7Validator
+
+# Rows read, normalized and validated per step
+IMPORT_CHUNK_ROWS = 5_000
+# Per-row errors kept for display; anything beyond is only counted
+MAX_REPORTED_ERRORS = 1_000
+IMPORT_FORMATS = {".csv": "CSV", ".xlsx": "Excel", ".parquet": "Parquet"}
+
+TASK_STATUSES = ["Pending", "In Progress", "Completed"]
+TASK_PRIORITIES = ["High", "Medium", "Low"]
+CLAIM_STATUSES = ["Pending", "Approved", "Rejected"]
+
+_TEXT = {"type": "string", "minLength": 1}
+_OPTIONAL_TEXT = {"type": "string"}
+_DATE = {"type": "string", "pattern": r"^\d{4}-\d{2}-\d{2}$"}
+_AMOUNT = {"type": "number", "minimum": 0}
+
+# One JSON schema per importable dataset, describing a single row after normalization
+IMPORT_SCHEMAS = {
+    "projects": {
+        "type": "object",
+        "required": ["id", "name"],
+        "properties": {
+            "id": _TEXT, "name": _TEXT, "client": _OPTIONAL_TEXT, "start_date": _DATE, "end_date": _DATE,
+            "budget": _AMOUNT, "progress": {"type": "integer", "minimum": 0, "maximum": 100},
+        },
+    },
+    "tasks": {
+        "type": "object",
+        "required": ["project_id", "task_name"],
+        "properties": {
+            "project_id": _TEXT, "task_name": _TEXT, "assigned_to": _OPTIONAL_TEXT,
+            "priority": {"enum": TASK_PRIORITIES}, "start_date": _DATE, "deadline": _DATE,
+            "status": {"enum": TASK_STATUSES}, "description": _OPTIONAL_TEXT,
+        },
+    },
+    "claims": {
+        "type": "object",
+        "required": ["project_id", "amount", "status"],
+        "properties": {
+            "project_id": _TEXT, "amount": _AMOUNT, "status": {"enum": CLAIM_STATUSES},
+            "payment_schedule": _DATE, "notes": _OPTIONAL_TEXT,
+        },
+    },
+}
+
+
+def _columns_of_type(dataset, types):
+    properties = IMPORT_SCHEMAS[dataset]["properties"]
+    return [column for column, schema in properties.items() if schema.get("type") in types]
+
+
+# Read a CSV, Excel or Parquet file (path or binary file object) as DataFrame chunks
+
+
+def read_chunks(source, file_format, chunk_size=IMPORT_CHUNK_ROWS):
+    import pandas as pd
+    if file_format == "CSV":
+        yield from pd.read_csv(source, dtype=str, chunksize=chunk_size, skipinitialspace=True)
+    elif file_format == "Parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif file_format == "Excel":
+        # openpyxl's read-only mode streams rows instead of loading the whole workbook
+        from openpyxl import load_workbook
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    yield pd.DataFrame(chunk, columns=header)
+                    chunk = []
+            if chunk:
+                yield pd.DataFrame(chunk, columns=header)
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+
+# Column-at-a-time clean-up of one chunk: dates become ISO strings, numbers become numbers and
+# blanks are dropped. A value that cannot be converted is kept as it was so the schema rejects it.
+
+
+def normalize(frame, dataset):
+    import pandas as pd
+    frame = frame.rename(columns=lambda column: str(column).strip().lower())
+    # Headers that only differ in case or spacing: the first one wins
+    frame = frame.loc[:, ~frame.columns.duplicated()]
+    columns = {}
+    for column in IMPORT_SCHEMAS[dataset]["properties"]:
+        if column not in frame:
+            continue
+        values = frame[column].astype(object).where(frame[column].notna(), None)
+        text = values.map(lambda value: value.strip() if isinstance(value, str) else value)
+        blank = text.isna() | (text == "")
+        if column in _columns_of_type(dataset, ("number", "integer")):
+            numbers = pd.to_numeric(text.where(~blank), errors="coerce")
+            integer = column in _columns_of_type(dataset, ("integer",))
+            if integer:
+                numbers = numbers.where(numbers % 1 == 0)
+            # Built as an object Series by hand: map() or astype() would infer float64 again
+            converted = pd.Series([None if pd.isna(value) else int(value) if integer else float(value)
+                                   for value in numbers], index=text.index, dtype=object)
+        elif IMPORT_SCHEMAS[dataset]["properties"][column] is _DATE:
+            parsed = pd.to_datetime(text.where(~blank), errors="coerce", format="mixed")
+            converted = parsed.dt.strftime("%Y-%m-%d").astype(object).where(parsed.notna(), None)
+        else:
+            converted = text.map(lambda value: value if value is None or isinstance(value, str) else str(value))
+        columns[column] = converted.where(converted.notna(), text).where(~blank, None)
+    # Zipped from the object columns: a DataFrame round trip would turn integer columns with blanks into floats
+    names = list(columns)
+    rows = zip(*(columns[name].tolist() for name in names)) if names else ((),) * len(frame)
+    # NaN can still come through from non-text sources, so it counts as blank too (NaN != NaN)
+    return [{name: value for name, value in zip(names, row) if value is not None and value == value} for row in rows]
+
+
+# Outcome of an import: counts plus the first MAX_REPORTED_ERRORS problems as
+# (row number in the file, column, message)
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_valid = 0
+        self.rows_imported = 0
+        self.error_count = 0
+        self.errors = []
+        self.committed = False
+
+    def add_error(self, row_number, column, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "column": column, "error": message})
+
+
+# Raised at the end of a strict import that found invalid rows, before anything is written
+
+
+class ImportAborted(Exception):
+    pass
+
+
+# Streaming validator: chunks() turns DataFrame chunks into lists of valid rows, recording every
+# problem in `report`. Each chunk is checked by one validator run over the whole batch (as a JSON
+# array), then against the existing projects in `registry`. In strict mode nothing more is passed
+# on after the first invalid row, but the rest of the file is still checked so every error is
+# reported, and ImportAborted is raised at the end.
+
+
+class ImportValidator:
+    def __init__(self, dataset, registry, strict=True):
+        self.dataset = dataset
+        self.registry = registry
+        self.strict = strict
+        self.report = ImportReport()
+        self.validator = Draft7Validator({"type": "array", "items": IMPORT_SCHEMAS[dataset]})
+        self._new_ids = set()
+
+    def chunks(self, frames):
+        for frame in frames:
+            first_row = self.report.rows_read + 2  # 1-based, after the header row
+            rows = normalize(frame, self.dataset)
+            self.report.rows_read += len(rows)
+            invalid = set()
+            for error in self.validator.iter_errors(rows):
+                position = error.path[0]
+                # Missing fields are reported against the row; the message names the field
+                column = error.path[1] if len(error.path) > 1 else ""
+                invalid.add(position)
+                self.report.add_error(first_row + position, column, error.message)
+            valid = []
+            for position, row in enumerate(rows):
+                problem = None if position in invalid else self._check_project(row)
+                if problem:
+                    self.report.add_error(first_row + position, *problem)
+                elif position not in invalid:
+                    valid.append(row)
+            self.report.rows_valid += len(valid)
+            yield [] if self.strict and self.report.error_count else valid
+        if self.strict and self.report.error_count:
+            raise ImportAborted()
+
+    def _check_project(self, row):
+        if self.dataset == "projects":
+            if row["id"] in self.registry or row["id"] in self._new_ids:
+                return "id", f"Project id {row['id']!r} already exists"
+            self._new_ids.add(row["id"])
+        elif row["project_id"] not in self.registry:
+            return "project_id", f"Unknown project {row['project_id']!r}"
+        return None
+
+
+def file_format_of(name):
+    return IMPORT_FORMATS.get(os.path.splitext(name)[1].lower())
+
+
+# Validate and import one file. Valid rows are written in a single transaction; unless
+# skip_invalid is set, any invalid row cancels the whole import.
+
+
+def import_file(repo, dataset, source, file_format, skip_invalid=False, actor=None, chunk_size=IMPORT_CHUNK_ROWS):
+    validator = ImportValidator(dataset, repo.registry, strict=not skip_invalid)
+    try:
+        validator.report.rows_imported = repo.bulk_import(dataset, validator.chunks(
+            read_chunks(source, file_format, chunk_size)), actor)
+        validator.report.committed = True
+    except ImportAborted:
+        pass
+    return validator.report
+
+
+if __name__ == "__main__":
+    # python importer.py {projects|tasks|claims} file.(csv|xlsx|parquet) [--skip-invalid]
+    from repository import open_repository
+    repository = open_repository()
+    report = import_file(repository, sys.argv[1], sys.argv[2], file_format_of(sys.argv[2]),
+                         skip_invalid="--skip-invalid" in sys.argv)
+    for problem in report.errors:
+        print(f"row {problem['row']}, {problem['column']}: {problem['error']}")
+    print(f"Read {report.rows_read} rows, {report.error_count} errors, imported {report.rows_imported}"
+          + ("" if report.committed else " (nothing was committed)"))
+    repository.close()
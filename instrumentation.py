@@ -0,0 +1,134 @@
+import functools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+TIMING_LOG_PATH = "civitas_timings.jsonl"
+# The log is rotated at this size, keeping this many older files next to it
+TIMING_LOG_BYTES = 5 * 1024 * 1024
+TIMING_LOG_BACKUPS = 3
+# Recent durations kept per span name for the percentiles
+SPAN_SAMPLES = 1_000
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# A started span; stop() (or leaving the with block) records it once
+
+
+class Span:
+    def __init__(self, timings, name, fields):
+        self.timings = timings
+        self.name = name
+        self.fields = fields
+        self.started = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stop(self):
+        if self.timings is not None:
+            self.timings.record(self.name, time.perf_counter() - self.started, self.fields)
+            self.timings = None
+
+
+# Handed out while recording is off, so a disabled span costs one attribute check
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def stop(self):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+# Process-wide timing spans and counters, off until enable() is called
+#
+# span(name) times a block; every finished span is appended to a rotating JSON-lines log at
+# `log_path` and its duration kept in a window of the most recent SPAN_SAMPLES per name, from
+# which summary() gives p50/p95. count(name, amount) adds to a counter. Fields passed to a span
+# (session, rerun, project and so on) are only written to the log.
+
+
+class Timings:
+    def __init__(self, log_path=TIMING_LOG_PATH, max_bytes=TIMING_LOG_BYTES, backups=TIMING_LOG_BACKUPS):
+        self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.enabled = False
+        self.counters = defaultdict(int)
+        self._durations = defaultdict(lambda: deque(maxlen=SPAN_SAMPLES))
+        self._lock = threading.Lock()
+        self._log = None
+
+    def enable(self):
+        with self._lock:
+            if self._log is None:
+                self._log = logging.getLogger(f"civitas.timings.{id(self)}")
+                self._log.propagate = False
+                self._log.setLevel(logging.INFO)
+                handler = RotatingFileHandler(self.log_path, maxBytes=self.max_bytes, backupCount=self.backups,
+                                              encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self._log.addHandler(handler)
+            self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, **fields):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, fields)
+
+    # Decorator form of span() for functions such as the chart builders
+
+    def timed(self, name):
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with Span(self, name, {}):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += amount
+
+    def record(self, name, seconds, fields):
+        with self._lock:
+            self._durations[name].append(seconds)
+        if self._log is not None:
+            self._log.info(json.dumps({"at": datetime.now().isoformat(timespec="milliseconds"), "span": name,
+                                       "ms": round(seconds * 1000, 3), **fields}, default=str))
+
+    def summary(self):
+        with self._lock:
+            durations = {name: sorted(samples) for name, samples in self._durations.items()}
+        return [{"span": name, "count": len(ordered), "p50_ms": _percentile(ordered, 0.5) * 1000,
+                 "p95_ms": _percentile(ordered, 0.95) * 1000} for name, ordered in sorted(durations.items())]
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self.counters.clear()
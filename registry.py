@@ -0,0 +1,94 @@
+import itertools
+
+# In-memory index of project records keyed by their unique id
+#
+# Both indexes are plain dicts, so lookups, inserts and deletes are O(1) and iteration follows
+# insertion order. Names are not unique, so the name index maps each name to the ids using it.
+# Each insert also gets a generation number that is never handed out again in this process, so
+# a project deleted and registered again under the same id has a new revision() even though its
+# version starts over.
+
+_generations = itertools.count(1)
+
+
+class ProjectRegistry:
+    def __init__(self, projects=()):
+        self._by_id = {}
+        self._by_name = {}
+        self._generations = {}
+        for project in projects:
+            self.insert(project)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __bool__(self):
+        return bool(self._by_id)
+
+    def __contains__(self, project_id):
+        return project_id in self._by_id
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def ids(self):
+        return list(self._by_id)
+
+    def get(self, project_id):
+        return self._by_id.get(project_id)
+
+    # (generation, version): changes on every write and never repeats, for keying caches
+
+    def revision(self, project_id):
+        return self._generations[project_id], self._by_id[project_id]["version"]
+
+    def find_by_name(self, name):
+        return [self._by_id[project_id] for project_id in self._by_name.get(name, ())]
+
+    # Ids of up to `limit` projects whose name or id contains `text` (ignoring case), in registry order.
+    # Runs over a snapshot, as other sessions' threads insert and delete while it loops.
+
+    def search(self, text, limit):
+        text = text.strip().lower()
+        matches = []
+        for project_id, project in list(self._by_id.items()):
+            if not text or text in project["name"].lower() or text in project_id.lower():
+                matches.append(project_id)
+                if len(matches) == limit:
+                    break
+        return matches
+
+    # Selectbox label; the id is only shown when another project has the same name
+
+    def label(self, project_id):
+        name = self._by_id[project_id]["name"]
+        return f"{name} ({project_id})" if len(self._by_name[name]) > 1 else name
+
+    # Mutations
+
+    def insert(self, project):
+        if project["id"] in self._by_id:
+            self._unindex_name(self._by_id[project["id"]])
+        self._by_id[project["id"]] = project
+        self._generations[project["id"]] = next(_generations)
+        self._by_name.setdefault(project["name"], {})[project["id"]] = None
+
+    def update(self, project_id, **fields):
+        project = self._by_id[project_id]
+        if "name" in fields:
+            self._unindex_name(project)
+            self._by_name.setdefault(fields["name"], {})[project_id] = None
+        project.update(fields)
+
+    def delete(self, project_id):
+        project = self._by_id.pop(project_id, None)
+        self._generations.pop(project_id, None)
+        if project is not None:
+            self._unindex_name(project)
+        return project
+
+    def _unindex_name(self, project):
+        ids = self._by_name[project["name"]]
+        del ids[project["id"]]
+        if not ids:
+            del self._by_name[project["name"]]
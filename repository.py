@@ -0,0 +1,849 @@
+import io
+import os
+import pickle
+import sqlite3
+import sys
+import tempfile
+import threading
+import warnings
+from collections import OrderedDict
+from datetime import date
+
+from blobstore import BLOB_DIR, BlobStore
+from claim_history import CLAIM_SNAPSHOT_EVERY, CLAIM_STATE_COLUMNS, decode_snapshot, encode_snapshot, replay, timestamp
+from registry import ProjectRegistry
+from rollups import FinancialRollups
+from search import TaskSearchIndex
+from storage import SNAPSHOT_PATH, JOURNAL_PATH, load_projects
+
+DATABASE_PATH = "civitas.db"
+# Fully loaded projects (tasks, comments, claims and documents) kept in memory, least recently used
+# first out
+PROJECT_CACHE_ENTRIES = 32
+
+# Schema migrations, applied in order and tracked through PRAGMA user_version
+
+
+MIGRATIONS = [
+    """
+    CREATE TABLE projects (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        client TEXT,
+        start_date TEXT,
+        end_date TEXT,
+        budget REAL NOT NULL DEFAULT 0,
+        progress INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE tasks (
+        id INTEGER PRIMARY KEY,
+        project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+        task_name TEXT NOT NULL,
+        assigned_to TEXT,
+        priority TEXT,
+        deadline TEXT,
+        status TEXT NOT NULL DEFAULT 'Pending',
+        description TEXT
+    );
+    CREATE TABLE comments (
+        id INTEGER PRIMARY KEY,
+        task_id INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+        body TEXT NOT NULL
+    );
+    CREATE TABLE interim_claims (
+        id INTEGER PRIMARY KEY,
+        project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+        amount REAL NOT NULL,
+        status TEXT NOT NULL,
+        payment_schedule TEXT,
+        notes TEXT
+    );
+    CREATE TABLE documents (
+        id INTEGER PRIMARY KEY,
+        project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+        name TEXT NOT NULL,
+        type TEXT,
+        size INTEGER NOT NULL DEFAULT 0,
+        content BLOB
+    );
+    CREATE INDEX idx_tasks_project_status_deadline ON tasks(project_id, status, deadline);
+    CREATE INDEX idx_tasks_project_deadline ON tasks(project_id, deadline);
+    CREATE INDEX idx_comments_task ON comments(task_id);
+    CREATE INDEX idx_claims_project_status_schedule ON interim_claims(project_id, status, payment_schedule);
+    CREATE INDEX idx_claims_project_schedule ON interim_claims(project_id, payment_schedule);
+    CREATE INDEX idx_claims_project_amount ON interim_claims(project_id, amount);
+    CREATE INDEX idx_documents_project ON documents(project_id);
+    """,
+    """
+    ALTER TABLE projects ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+    """,
+    """
+    ALTER TABLE documents ADD COLUMN sha256 TEXT;
+    ALTER TABLE documents ADD COLUMN category TEXT;
+    ALTER TABLE documents ADD COLUMN title TEXT;
+    ALTER TABLE documents ADD COLUMN description TEXT;
+    CREATE INDEX idx_documents_sha256 ON documents(sha256);
+    """,
+    """
+    ALTER TABLE tasks ADD COLUMN start_date TEXT;
+    """,
+    """
+    CREATE TABLE spend_entries (
+        id INTEGER PRIMARY KEY,
+        project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+        amount REAL NOT NULL,
+        spent_on TEXT,
+        description TEXT
+    );
+    CREATE INDEX idx_spend_project ON spend_entries(project_id, spent_on);
+    """,
+    """
+    CREATE TABLE claim_events (
+        id INTEGER PRIMARY KEY,
+        claim_id INTEGER NOT NULL,
+        project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+        recorded_at TEXT NOT NULL,
+        actor TEXT,
+        kind TEXT NOT NULL,
+        old_status TEXT,
+        amount REAL,
+        status TEXT,
+        payment_schedule TEXT,
+        notes TEXT
+    );
+    CREATE TABLE claim_snapshots (
+        id INTEGER PRIMARY KEY,
+        project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+        recorded_at TEXT NOT NULL,
+        last_event_id INTEGER NOT NULL,
+        claims TEXT NOT NULL
+    );
+    CREATE INDEX idx_claim_events_project ON claim_events(project_id, id);
+    CREATE INDEX idx_claim_events_claim ON claim_events(claim_id, id);
+    CREATE INDEX idx_claim_snapshots_project ON claim_snapshots(project_id, recorded_at);
+    -- Claims from before the history existed start it with a creation event dated now
+    INSERT INTO claim_events (claim_id, project_id, recorded_at, kind, amount, status, payment_schedule, notes)
+    SELECT id, project_id, strftime('%Y-%m-%dT%H:%M:%f', 'now'), 'created', amount, status, payment_schedule, notes
+    FROM interim_claims ORDER BY id;
+    """,
+    """
+    CREATE TABLE meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    -- Databases that already hold projects were filled from projects.json when they were created
+    INSERT INTO meta (key, value) SELECT 'json_imported', '1' WHERE EXISTS (SELECT 1 FROM projects);
+    """,
+]
+
+PROJECT_COLUMNS = ["id", "name", "client", "start_date", "end_date", "budget", "progress", "version"]
+PROJECT_DEFAULTS = {"budget": 0, "progress": 0, "version": 0}
+TASK_COLUMNS = ["task_name", "assigned_to", "priority", "start_date", "deadline", "status", "description"]
+CLAIM_COLUMNS = ["amount", "status", "payment_schedule", "notes"]
+SPEND_COLUMNS = ["amount", "spent_on", "description"]
+# Bulk import targets: dataset -> (table, columns, defaults for missing values)
+IMPORT_TARGETS = {
+    "projects": ("projects", PROJECT_COLUMNS, PROJECT_DEFAULTS),
+    "tasks": ("tasks", ["project_id"] + TASK_COLUMNS, {"status": "Pending"}),
+    "claims": ("interim_claims", ["project_id"] + CLAIM_COLUMNS, {}),
+}
+# Row sources for exports: dataset -> SELECT whose rows are streamed in id order. The WHERE clause
+# is filled in with either every project or a single project_id.
+EXPORT_QUERIES = {
+    "claims": f"SELECT id, project_id, {', '.join(CLAIM_COLUMNS)} FROM interim_claims WHERE {{where}} ORDER BY id",
+    "tasks": f"SELECT id, project_id, {', '.join(TASK_COLUMNS)} FROM tasks WHERE {{where}} ORDER BY id",
+    "projects": (
+        f"SELECT {', '.join(PROJECT_COLUMNS)}, "
+        "(SELECT COUNT(*) FROM tasks t WHERE t.project_id = p.id) AS tasks, "
+        "(SELECT COUNT(*) FROM tasks t WHERE t.project_id = p.id AND t.status = 'Completed') AS completed_tasks, "
+        "(SELECT COALESCE(SUM(amount), 0) FROM spend_entries s WHERE s.project_id = p.id) AS spent, "
+        "(SELECT COALESCE(SUM(amount), 0) FROM interim_claims c WHERE c.project_id = p.id) AS claimed, "
+        "(SELECT COALESCE(SUM(amount), 0) FROM interim_claims c WHERE c.project_id = p.id "
+        "AND c.status = 'Approved') AS approved "
+        "FROM projects p WHERE {where} ORDER BY p.rowid"
+    ),
+}
+CLAIM_EVENT_COLUMNS = ["claim_id", "recorded_at", "actor", "kind", "old_status"] + CLAIM_STATE_COLUMNS
+# File contents live in the blob store; a document row only carries metadata and the content hash
+DOCUMENT_COLUMNS = ["name", "type", "size", "sha256", "category", "title", "description"]
+
+
+# Raised when a write was based on a project version that another session has since replaced
+
+
+class ConflictError(Exception):
+    def __init__(self, project_id):
+        super().__init__(f"Project {project_id} was changed or deleted by someone else since you loaded it. "
+                         f"Your change was not saved; please review the latest data and try again.")
+        self.project_id = project_id
+
+
+# SQLite-backed project repository
+#
+# The app keeps one instance per process and shares it between every browser session, so the
+# connection is opened with check_same_thread=False and all access is serialized by `lock`.
+# Document contents are kept in a content-addressed BlobStore next to the database.
+# `registry` holds the project rows (without tasks, claims or documents) and is kept in step
+# with every write, so the tabs never have to re-read the project list. The cross-project task
+# search index and the financial rollups are built on first use and then updated by the writes
+# that affect them.
+#
+# Every write bumps the owning project's `version` in the same transaction. Passing the version a
+# session last saw as `expected_version` turns a lost update into a ConflictError. `data_version`
+# increases on every change, including commits made through other connections (see refresh),
+# and is meant for keying caches built on top of the repository.
+#
+# Claims are also kept as an append-only history: every creation and status change adds a
+# claim_events row (who, when, old status and the claim as it stood afterwards) in the same
+# transaction that updates interim_claims, which holds the current state. After every
+# CLAIM_SNAPSHOT_EVERY events a project's claims are snapshotted, so claims_as_of() replays at
+# most that many events on top of the nearest earlier snapshot.
+
+
+class ProjectRepository:
+    def __init__(self, path=DATABASE_PATH, blob_dir=BLOB_DIR):
+        self.path = path
+        self.blobs = BlobStore(blob_dir)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.writes = 0
+        self.skipped_writes = 0
+        self.data_version = 0
+        self._migrate_schema()
+        self._move_document_content()
+        self._sqlite_data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        self.registry = ProjectRegistry(self.list_projects())
+        self._task_index = None
+        # Held while the task index is built, so concurrent searches wait for one build
+        self._task_index_build = threading.Lock()
+        self._rollups = None
+        self._loaded_projects = OrderedDict()
+
+    def _migrate_schema(self):
+        with self.lock:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+                self.conn.executescript(f"BEGIN; {script}; PRAGMA user_version = {number}; COMMIT;")
+
+    # Documents uploaded before the blob store existed kept their bytes in the database
+
+    def _move_document_content(self):
+        with self.lock:
+            legacy = self.conn.execute("SELECT id FROM documents WHERE content IS NOT NULL").fetchall()
+            for (document_id,) in legacy:
+                content = self.conn.execute("SELECT content FROM documents WHERE id = ?", (document_id,)).fetchone()[0]
+                digest, size = self.blobs.put_stream(io.BytesIO(content))
+                with self.conn:
+                    self.conn.execute("UPDATE documents SET sha256 = ?, size = ?, content = NULL WHERE id = ?",
+                                      (digest, size, document_id))
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    # Reload the registry if another connection committed since we last looked. Their other changes
+    # are unknown, so the search index and rollups are rebuilt on their next use.
+
+    def refresh(self):
+        with self.lock:
+            sqlite_data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if sqlite_data_version == self._sqlite_data_version:
+                return False
+            self._sqlite_data_version = sqlite_data_version
+            self.registry = ProjectRegistry(self.list_projects())
+            self._task_index = None
+            self._rollups = None
+            # A project deleted and re-created elsewhere starts again at the version a cached copy has
+            self._loaded_projects.clear()
+            self.data_version += 1
+            return True
+
+    def _bump_version(self, project_id, expected_version):
+        cursor = self.conn.execute(
+            "UPDATE projects SET version = version + 1 WHERE id = ? AND (? IS NULL OR version = ?)",
+            (project_id, expected_version, expected_version))
+        if cursor.rowcount == 0:
+            raise ConflictError(project_id)
+        return self.conn.execute("SELECT version FROM projects WHERE id = ?", (project_id,)).fetchone()[0]
+
+    def _committed(self, project_id, version):
+        self.registry.update(project_id, version=version)
+        self.writes += 1
+        self.data_version += 1
+
+    # Single-statement write to one project; an UPDATE whose WHERE clause matches nothing is a
+    # no-op that leaves the version alone. Returns whether anything changed.
+
+    def _write(self, project_id, sql, params=(), expected_version=None):
+        with self.lock:
+            with self.conn:
+                if self.conn.execute(sql, params).rowcount == 0:
+                    self.skipped_writes += 1
+                    return False
+                version = self._bump_version(project_id, expected_version)
+            self._committed(project_id, version)
+        return True
+
+    # Run an _insert_* helper for one project and return the new row id
+
+    def _insert(self, project_id, insert, *args, expected_version=None):
+        with self.lock:
+            with self.conn:
+                row_id = insert(project_id, *args)
+                version = self._bump_version(project_id, expected_version)
+            self._committed(project_id, version)
+        return row_id
+
+    def _owner(self, table, row_id):
+        row = self.conn.execute(f"SELECT project_id FROM {table} WHERE id = ?", (row_id,)).fetchone()
+        return row[0] if row else None
+
+    # A separate read-only connection, for long reads such as exports that should not hold `lock`.
+    # WAL mode lets it read a consistent snapshot while this connection keeps writing.
+
+    def open_reader(self):
+        conn = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True, check_same_thread=False,
+                               timeout=30)
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    # (sql, params) selecting an export dataset for one project, or for all of them
+
+    def export_query(self, dataset, project_id=None):
+        column = "p.id" if dataset == "projects" else "project_id"
+        where, params = (f"{column} = ?", (project_id,)) if project_id is not None else ("1 = 1", ())
+        return EXPORT_QUERIES[dataset].format(where=where), params
+
+    # Committed writes, and writes skipped because their UPDATE or DELETE matched nothing (such as a
+    # progress "change" to the value already stored)
+
+    @property
+    def stats(self):
+        return {"writes": self.writes, "skipped_writes": self.skipped_writes}
+
+    def close(self):
+        self.conn.close()
+
+    # Projects
+
+    def list_projects(self):
+        return self._query(f"SELECT {', '.join(PROJECT_COLUMNS)} FROM projects ORDER BY rowid")
+
+    def get_project(self, project_id):
+        rows = self._query(f"SELECT {', '.join(PROJECT_COLUMNS)} FROM projects WHERE id = ?", (project_id,))
+        return rows[0] if rows else None
+
+    # The full nested project, in the shape the old projects.json used, read with one query per table.
+    # Loaded projects are kept in an LRU of PROJECT_CACHE_ENTRIES and reused while their version
+    # matches the registry; every write bumps it. The result is shared, so callers must not modify it.
+
+    def load_project(self, project_id):
+        with self.lock:
+            current = self.registry.get(project_id)
+            if current is None:
+                self._loaded_projects.pop(project_id, None)
+                return None
+            project = self._loaded_projects.get(project_id)
+            if project is not None and project["version"] == current["version"]:
+                self._loaded_projects.move_to_end(project_id)
+                return project
+            project = self.get_project(project_id)
+            project["tasks"] = self.list_tasks(project_id)
+            comments = {}
+            for task_id, body in self.conn.execute(
+                    "SELECT c.task_id, c.body FROM comments c JOIN tasks t ON t.id = c.task_id "
+                    "WHERE t.project_id = ? ORDER BY c.id", (project_id,)):
+                comments.setdefault(task_id, []).append(body)
+            for task in project["tasks"]:
+                task["comments"] = comments.get(task["id"], [])
+            project["documents"] = self.list_documents(project_id)
+            project["interim_claims"] = self.list_claims(project_id)
+            self._loaded_projects[project_id] = project
+            while len(self._loaded_projects) > PROJECT_CACHE_ENTRIES:
+                self._loaded_projects.popitem(last=False)
+            return project
+
+    def add_project(self, project):
+        with self.lock:
+            with self.conn:
+                row = self._insert_project(project)
+            self.registry.insert(row)
+            if self._rollups is not None:
+                self._rollups.add_project(row)
+            self.writes += 1
+            self.data_version += 1
+        return True
+
+    def _insert_project(self, project):
+        row = {column: project.get(column, PROJECT_DEFAULTS.get(column)) for column in PROJECT_COLUMNS}
+        self.conn.execute(
+            f"INSERT INTO projects ({', '.join(PROJECT_COLUMNS)}) VALUES ({', '.join('?' * len(PROJECT_COLUMNS))})",
+            list(row.values()))
+        for task in project.get("tasks", []):
+            task_id = self._insert_task(project["id"], task)
+            for body in task.get("comments", []):
+                self.conn.execute("INSERT INTO comments (task_id, body) VALUES (?, ?)", (task_id, body))
+        for claim in project.get("interim_claims", []):
+            self._insert_claim(project["id"], claim)
+        for doc in project.get("documents", []):
+            # Only metadata ever made it into projects.json; file contents were never serializable
+            if isinstance(doc, dict) and "name" in doc:
+                self.conn.execute("INSERT INTO documents (project_id, name, type, size) VALUES (?, ?, ?, ?)",
+                                  (project["id"], doc["name"], doc.get("type"), doc.get("size", 0)))
+        return row
+
+    def delete_project(self, project_id, expected_version=None):
+        with self.lock:
+            # Document rows go with the project, so their blobs are checked once it is gone
+            digests = [row["sha256"] for row in self._query(
+                "SELECT DISTINCT sha256 FROM documents WHERE project_id = ?", (project_id,))]
+            with self.conn:
+                cursor = self.conn.execute("DELETE FROM projects WHERE id = ? AND (? IS NULL OR version = ?)",
+                                           (project_id, expected_version, expected_version))
+            if cursor.rowcount == 0:
+                if self.get_project(project_id) is not None:
+                    raise ConflictError(project_id)
+                return False
+            self.registry.delete(project_id)
+            self._loaded_projects.pop(project_id, None)
+            self._drop_unreferenced_blobs(digests)
+            if self._task_index is not None:
+                self._task_index.remove_project(project_id)
+            if self._rollups is not None:
+                self._rollups.remove_project(project_id)
+            self.writes += 1
+            self.data_version += 1
+        return True
+
+    def set_progress(self, project_id, progress, expected_version=None):
+        with self.lock:
+            # The WHERE clause makes an unchanged value a no-op rather than a write
+            changed = self._write(project_id, "UPDATE projects SET progress = ? WHERE id = ? AND progress != ?",
+                                  (progress, project_id, progress), expected_version)
+            if changed:
+                self.registry.update(project_id, progress=progress)
+        return changed
+
+    # Tasks and comments
+
+    def _insert_task(self, project_id, task):
+        row = dict(task, status=task.get("status") or "Pending")
+        for column in ("start_date", "deadline"):
+            if isinstance(row.get(column), date):
+                row[column] = row[column].isoformat()
+        cursor = self.conn.execute(
+            f"INSERT INTO tasks (project_id, {', '.join(TASK_COLUMNS)}) VALUES (?{', ?' * len(TASK_COLUMNS)})",
+            [project_id] + [row.get(column) for column in TASK_COLUMNS])
+        return cursor.lastrowid
+
+    def add_task(self, project_id, task, expected_version=None):
+        with self.lock:
+            task_id = self._insert(project_id, self._insert_task, task, expected_version=expected_version)
+            if self._task_index is not None:
+                self._task_index.add(self._query(f"SELECT id, project_id, {', '.join(TASK_COLUMNS)} FROM tasks "
+                                                 f"WHERE id = ?", (task_id,))[0])
+        return task_id
+
+    def list_tasks(self, project_id, limit=None, offset=0):
+        sql = f"SELECT id, {', '.join(TASK_COLUMNS)} FROM tasks WHERE project_id = ? ORDER BY id"
+        if limit is None:
+            return self._query(sql, (project_id,))
+        return self._query(sql + " LIMIT ? OFFSET ?", (project_id, limit, offset))
+
+    def count_tasks(self, project_id):
+        return self._query("SELECT COUNT(*) AS n FROM tasks WHERE project_id = ?", (project_id,))[0]["n"]
+
+    # Just the fields a Gantt chart needs, for every task in the project
+
+    def list_task_schedule(self, project_id):
+        return self._query("SELECT id, task_name, assigned_to, status, start_date, deadline FROM tasks "
+                           "WHERE project_id = ? ORDER BY id", (project_id,))
+
+    # Status edits from the task grid, {task_id: status}, saved as one transaction and one version
+    # bump. Returns how many tasks actually changed.
+
+    def update_task_statuses(self, project_id, statuses, expected_version=None):
+        with self.lock:
+            with self.conn:
+                cursor = self.conn.executemany(
+                    "UPDATE tasks SET status = ? WHERE id = ? AND project_id = ? AND status != ?",
+                    [(status, task_id, project_id, status) for task_id, status in statuses.items()])
+                if cursor.rowcount <= 0:
+                    self.skipped_writes += 1
+                    return 0
+                version = self._bump_version(project_id, expected_version)
+            self._committed(project_id, version)
+            if self._task_index is not None:
+                for task_id, status in statuses.items():
+                    self._task_index.update(task_id, status=status)
+        return cursor.rowcount
+
+    # Bulk import of already validated rows (see importer.py). `chunks` is read to the end first,
+    # without the lock, staging each chunk in a temporary file: reading and validating a large file
+    # must not stall every other session's refresh(). An exception from `chunks` therefore writes
+    # nothing. The staged chunks are then inserted in one transaction. Each project that gains rows
+    # gets a single version bump, and imported claims are recorded in the claim history as created
+    # by `actor`. Returns the number of rows inserted.
+
+    def bulk_import(self, dataset, chunks, actor=None):
+        table, columns, defaults = IMPORT_TARGETS[dataset]
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        with tempfile.TemporaryFile() as staged:
+            touched = set()
+            for rows in chunks:
+                if rows:
+                    pickle.dump([[row.get(column, defaults.get(column)) for column in columns] for row in rows],
+                                staged, pickle.HIGHEST_PROTOCOL)
+                if dataset != "projects":
+                    touched.update(row["project_id"] for row in rows)
+            staged.seek(0)
+            return self._insert_staged(dataset, sql, staged, touched, actor)
+
+    # Second half of bulk_import: the insert and commit, the only part that holds the lock
+
+    def _insert_staged(self, dataset, sql, staged, touched, actor):
+        with self.lock:
+            with self.conn:
+                first_claim_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM interim_claims").fetchone()[0]
+                last_project_row = self.conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM projects").fetchone()[0]
+                count = 0
+                while True:
+                    try:
+                        values = pickle.load(staged)
+                    except EOFError:
+                        break
+                    self.conn.executemany(sql, values)
+                    count += len(values)
+                if dataset == "claims":
+                    # One creation event per imported claim, written by a single statement
+                    self.conn.execute(
+                        f"INSERT INTO claim_events (project_id, {', '.join(CLAIM_EVENT_COLUMNS)}) "
+                        f"SELECT project_id, id, ?, ?, 'created', NULL, {', '.join(CLAIM_STATE_COLUMNS)} "
+                        f"FROM interim_claims WHERE id >= ? ORDER BY id", (timestamp(), actor, first_claim_id))
+                    for project_id in touched:
+                        self._snapshot_claims_if_due(project_id)
+                versions = {project_id: self._bump_version(project_id, None) for project_id in touched}
+            if dataset == "projects":
+                # Read back, so the registry holds the values as stored rather than as they were passed in
+                for project in self._query(f"SELECT {', '.join(PROJECT_COLUMNS)} FROM projects WHERE rowid > ? "
+                                           f"ORDER BY rowid", (last_project_row,)):
+                    self.registry.insert(project)
+            for project_id, version in versions.items():
+                self.registry.update(project_id, version=version)
+            if count:
+                # Rebuilding once beats replaying thousands of rows into the index and rollups
+                self._task_index = None
+                self._rollups = None
+                self.writes += 1
+                self.data_version += 1
+        return count
+
+    # Cross-project task search index, built from the database on first use and again after a bulk
+    # import or an outside change. A build of a large portfolio takes seconds, so it reads through
+    # its own connection without holding `lock`, and the result is swapped in only if nothing was
+    # written meanwhile (`data_version` unchanged). Otherwise the build still answers this caller,
+    # and the next search builds again, since writes made during the build may be missing from it.
+
+    def task_index(self):
+        with self._task_index_build:
+            with self.lock:
+                if self._task_index is not None:
+                    return self._task_index
+                built_at = self.data_version
+            index = self._build_task_index()
+            with self.lock:
+                if self.data_version == built_at:
+                    self._task_index = index
+            return index
+
+    def _build_task_index(self):
+        reader = self.open_reader()
+        try:
+            reader.row_factory = sqlite3.Row
+            # One read transaction, so tasks and comments come from the same snapshot
+            reader.execute("BEGIN")
+            comments = {}
+            for task_id, body in reader.execute("SELECT task_id, body FROM comments ORDER BY id"):
+                comments.setdefault(task_id, []).append(body)
+            rows = reader.execute(f"SELECT id, project_id, {', '.join(TASK_COLUMNS)} FROM tasks ORDER BY id")
+            return TaskSearchIndex(dict(row, comments=comments.get(row["id"], [])) for row in rows)
+        finally:
+            reader.close()
+
+    # Ranked search over the names, assignees, descriptions and comments of every project's tasks
+    # (or one project's, given project_id); see TaskSearchIndex.search for the filters
+
+    def search_tasks(self, query="", project_id=None, status=None, priority=None, deadline_from=None,
+                     deadline_to=None, limit=50):
+        index = self.task_index()
+        with self.lock:
+            return index.search(query, project_id, status, priority, deadline_from, deadline_to, limit)
+
+    def add_comment(self, task_id, body, expected_version=None):
+        with self.lock:
+            added = self._write(self._owner("tasks", task_id), "INSERT INTO comments (task_id, body) VALUES (?, ?)",
+                                (task_id, body), expected_version)
+            if added and self._task_index is not None:
+                self._task_index.add_comment(task_id, body)
+        return added
+
+    def list_comments(self, task_id):
+        return self._query("SELECT id, body FROM comments WHERE task_id = ? ORDER BY id", (task_id,))
+
+    # Interim claims
+
+    def _insert_claim(self, project_id, claim, actor=None):
+        cursor = self.conn.execute(
+            f"INSERT INTO interim_claims (project_id, {', '.join(CLAIM_COLUMNS)}) "
+            f"VALUES (?{', ?' * len(CLAIM_COLUMNS)})",
+            [project_id] + [claim.get(column) for column in CLAIM_COLUMNS])
+        self._record_claim_event(project_id, dict(claim, id=cursor.lastrowid), "created", actor)
+        return cursor.lastrowid
+
+    def add_claim(self, project_id, claim, actor=None, expected_version=None):
+        with self.lock:
+            claim_id = self._insert(project_id, self._insert_claim, claim, actor, expected_version=expected_version)
+            if self._rollups is not None:
+                self._rollups.add_claim(project_id, self._claim(claim_id))
+        return claim_id
+
+    def _claim(self, claim_id):
+        rows = self._query(f"SELECT id, {', '.join(CLAIM_COLUMNS)} FROM interim_claims WHERE id = ?", (claim_id,))
+        return rows[0] if rows else None
+
+    def list_claims(self, project_id):
+        return self._query(
+            f"SELECT id, {', '.join(CLAIM_COLUMNS)} FROM interim_claims WHERE project_id = ? ORDER BY id",
+            (project_id,))
+
+    def count_claims(self, project_id):
+        return self._query("SELECT COUNT(*) AS claims FROM interim_claims WHERE project_id = ?",
+                           (project_id,))[0]["claims"]
+
+    def update_claim_status(self, claim_id, status, actor=None, expected_version=None):
+        with self.lock:
+            project_id, claim = self._owner("interim_claims", claim_id), self._claim(claim_id)
+            if claim is None or claim["status"] == status:
+                self.skipped_writes += 1
+                return False
+            with self.conn:
+                self.conn.execute("UPDATE interim_claims SET status = ? WHERE id = ?", (status, claim_id))
+                self._record_claim_event(project_id, dict(claim, status=status), "status", actor, claim["status"])
+                version = self._bump_version(project_id, expected_version)
+            self._committed(project_id, version)
+            if self._rollups is not None:
+                self._rollups.change_claim_status(project_id, claim, status)
+        return True
+
+    # Claim history. Events are only ever appended, inside the transaction of the write they record.
+
+    def _record_claim_event(self, project_id, claim, kind, actor, old_status=None):
+        self.conn.execute(
+            f"INSERT INTO claim_events (project_id, {', '.join(CLAIM_EVENT_COLUMNS)}) "
+            f"VALUES (?{', ?' * len(CLAIM_EVENT_COLUMNS)})",
+            [project_id, claim["id"], timestamp(), actor, kind, old_status]
+            + [claim.get(column) for column in CLAIM_STATE_COLUMNS])
+        self._snapshot_claims_if_due(project_id)
+
+    def _snapshot_claims_if_due(self, project_id):
+        last_event_id = self.conn.execute(
+            "SELECT COALESCE(MAX(last_event_id), 0) FROM claim_snapshots WHERE project_id = ?",
+            (project_id,)).fetchone()[0]
+        pending = self.conn.execute("SELECT COUNT(*), MAX(id) FROM claim_events WHERE project_id = ? AND id > ?",
+                                    (project_id, last_event_id)).fetchone()
+        if pending[0] >= CLAIM_SNAPSHOT_EVERY:
+            # interim_claims already holds the state these events lead to
+            claims = self.conn.execute(f"SELECT id, {', '.join(CLAIM_COLUMNS)} FROM interim_claims "
+                                       f"WHERE project_id = ? ORDER BY id", (project_id,))
+            self.conn.execute(
+                "INSERT INTO claim_snapshots (project_id, recorded_at, last_event_id, claims) VALUES (?, ?, ?, ?)",
+                (project_id, timestamp(), pending[1], encode_snapshot(claims)))
+
+    # Newest first, one page at a time
+
+    def list_claim_events(self, project_id, limit=None, offset=0):
+        return self._query(
+            f"SELECT id, {', '.join(CLAIM_EVENT_COLUMNS)} FROM claim_events WHERE project_id = ? "
+            f"ORDER BY id DESC LIMIT ? OFFSET ?", (project_id, -1 if limit is None else limit, offset))
+
+    def count_claim_events(self, project_id):
+        return self._query("SELECT COUNT(*) AS events FROM claim_events WHERE project_id = ?",
+                           (project_id,))[0]["events"]
+
+    # A project's claims as they stood at `as_of` (a claim_history.timestamp() string; None for now),
+    # rebuilt from the latest snapshot taken by then plus the events recorded after it
+
+    def claims_as_of(self, project_id, as_of=None):
+        with self.lock:
+            snapshot = self.conn.execute(
+                "SELECT last_event_id, claims FROM claim_snapshots WHERE project_id = ? "
+                "AND (? IS NULL OR recorded_at <= ?) ORDER BY recorded_at DESC, id DESC LIMIT 1",
+                (project_id, as_of, as_of)).fetchone()
+            last_event_id, state = (snapshot[0], decode_snapshot(snapshot[1])) if snapshot else (0, {})
+            events = self.conn.execute(
+                f"SELECT claim_id, {', '.join(CLAIM_STATE_COLUMNS)} FROM claim_events WHERE project_id = ? "
+                f"AND id > ? AND (? IS NULL OR recorded_at <= ?) ORDER BY id",
+                (project_id, last_event_id, as_of, as_of))
+            return replay(state, events)
+
+    # Spend entries
+
+    def _insert_spend(self, project_id, entry):
+        row = dict(entry)
+        if isinstance(row.get("spent_on"), date):
+            row["spent_on"] = row["spent_on"].isoformat()
+        cursor = self.conn.execute(
+            f"INSERT INTO spend_entries (project_id, {', '.join(SPEND_COLUMNS)}) "
+            f"VALUES (?{', ?' * len(SPEND_COLUMNS)})",
+            [project_id] + [row.get(column) for column in SPEND_COLUMNS])
+        return cursor.lastrowid
+
+    def add_spend(self, project_id, entry, expected_version=None):
+        with self.lock:
+            spend_id = self._insert(project_id, self._insert_spend, entry, expected_version=expected_version)
+            if self._rollups is not None:
+                self._rollups.add_spend(project_id, entry["amount"])
+        return spend_id
+
+    def list_spend(self, project_id):
+        return self._query(f"SELECT id, {', '.join(SPEND_COLUMNS)} FROM spend_entries WHERE project_id = ? "
+                           f"ORDER BY spent_on, id", (project_id,))
+
+    # Budget, spend and claim totals per project, per client and for the portfolio, built with one
+    # pass over the database on first use and kept current by the writes above
+
+    def rollups(self):
+        with self.lock:
+            if self._rollups is None:
+                spend = self.conn.execute("SELECT project_id, SUM(amount) FROM spend_entries GROUP BY project_id")
+                claims = self.conn.execute(
+                    "SELECT project_id, status, payment_schedule, SUM(amount) FROM interim_claims "
+                    "GROUP BY project_id, status, substr(payment_schedule, 1, 7)")
+                self._rollups = FinancialRollups(
+                    self.registry, spend.fetchall(),
+                    [(project_id, {"status": status, "payment_schedule": schedule, "amount": amount})
+                     for project_id, status, schedule, amount in claims])
+            return self._rollups
+
+    # Documents
+
+    def _insert_document(self, project_id, document):
+        cursor = self.conn.execute(
+            f"INSERT INTO documents (project_id, {', '.join(DOCUMENT_COLUMNS)}) "
+            f"VALUES (?{', ?' * len(DOCUMENT_COLUMNS)})",
+            [project_id] + [document.get(column) for column in DOCUMENT_COLUMNS])
+        return cursor.lastrowid
+
+    # Stream an uploaded file into the blob store and record its metadata against the project.
+    # Returns the new document id, or None if the project already has a document with this content.
+
+    def add_document(self, project_id, stream, name, mime_type, category=None, title=None, description=None,
+                     expected_version=None):
+        # Hashing and copying the file is the slow part, so it happens before taking the lock
+        digest, size = self.blobs.put_stream(stream)
+        with self.lock:
+            if self._query("SELECT 1 FROM documents WHERE project_id = ? AND sha256 = ?", (project_id, digest)):
+                self.skipped_writes += 1
+                return None
+            if not self.blobs.exists(digest):
+                # The last other reference was deleted while we were uploading
+                stream.seek(0)
+                self.blobs.put_stream(stream)
+            document = {"name": name, "type": mime_type, "size": size, "sha256": digest, "category": category,
+                        "title": title, "description": description}
+            try:
+                return self._insert(project_id, self._insert_document, document, expected_version=expected_version)
+            except Exception:
+                # A conflict or a deleted project: the blob stored above may now belong to nothing
+                self._drop_unreferenced_blobs([digest])
+                raise
+
+    def list_documents(self, project_id):
+        return self._query(f"SELECT id, {', '.join(DOCUMENT_COLUMNS)} FROM documents WHERE project_id = ? "
+                           f"ORDER BY id", (project_id,))
+
+    def update_document_metadata(self, document_id, category, title, description, expected_version=None):
+        with self.lock:
+            return self._write(self._owner("documents", document_id),
+                               "UPDATE documents SET category = ?, title = ?, description = ? WHERE id = ? "
+                               "AND (category, title, description) IS NOT (?, ?, ?)",
+                               (category, title, description, document_id, category, title, description),
+                               expected_version)
+
+    def delete_document(self, document_id, expected_version=None):
+        with self.lock:
+            rows = self._query("SELECT sha256 FROM documents WHERE id = ?", (document_id,))
+            deleted = self._write(self._owner("documents", document_id), "DELETE FROM documents WHERE id = ?",
+                                  (document_id,), expected_version)
+            if deleted and rows:
+                self._drop_unreferenced_blobs([rows[0]["sha256"]])
+        return deleted
+
+    # Delete the blobs that no document refers to any more
+
+    def _drop_unreferenced_blobs(self, digests):
+        for digest in digests:
+            if digest and not self._query("SELECT 1 FROM documents WHERE sha256 = ? LIMIT 1", (digest,)):
+                self.blobs.delete(digest)
+
+
+# One-shot import of projects.json (plus any journal written on top of it) into the database. The
+# import and the flag recording it commit together, so an import that fails is retried on the next
+# start. Ids that appear more than once (or are already in the database) keep their first project;
+# returns (projects imported, ids skipped).
+
+
+def migrate_from_json(repo, snapshot_path=SNAPSHOT_PATH, journal_path=JOURNAL_PATH):
+    projects = load_projects(snapshot_path, journal_path)
+    with repo.lock:
+        seen, imported, skipped = set(repo.registry.ids()), [], []
+        for project in projects:
+            (skipped if project["id"] in seen else imported).append(project)
+            seen.add(project["id"])
+        with repo.conn:
+            rows = [repo._insert_project(project) for project in imported]
+            repo.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', '1')")
+        for row in rows:
+            repo.registry.insert(row)
+        repo._task_index = None
+        repo._rollups = None
+        repo.writes += 1
+        repo.data_version += 1
+    return len(rows), [project["id"] for project in skipped]
+
+
+def json_imported(repo):
+    return bool(repo._query("SELECT 1 FROM meta WHERE key = 'json_imported'"))
+
+
+# Open the database, importing projects.json until that has succeeded once. A database that
+# starts out without projects.json never imports one later.
+
+
+def open_repository(path=DATABASE_PATH, snapshot_path=SNAPSHOT_PATH, journal_path=JOURNAL_PATH, blob_dir=BLOB_DIR):
+    repo = ProjectRepository(path, blob_dir)
+    if not json_imported(repo):
+        if os.path.exists(snapshot_path):
+            count, skipped = migrate_from_json(repo, snapshot_path, journal_path)
+            if skipped:
+                warnings.warn(f"Imported {count} projects from {snapshot_path}; skipped duplicate ids: "
+                              f"{', '.join(map(str, skipped))}")
+        else:
+            with repo.lock, repo.conn:
+                repo.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', '1')")
+    return repo
+
+
+if __name__ == "__main__":
+    # python repository.py [projects.json] [civitas.db]
+    source = sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_PATH
+    target = sys.argv[2] if len(sys.argv) > 2 else DATABASE_PATH
+    repository = ProjectRepository(target)
+    count, skipped = migrate_from_json(repository, source)
+    print(f"Migrated {count} projects from {source} into {target}"
+          + (f"; skipped duplicate ids: {', '.join(map(str, skipped))}" if skipped else ""))
+    repository.close()
@@ -0,0 +1,134 @@
+from datetime import date
+
+ROLLUP_FIELDS = ["budget", "spent", "claimed", "approved", "pending", "remaining"]
+# Claim statuses that have their own rollup total; every claim counts towards "claimed"
+CLAIM_BUCKETS = {"Approved": "approved", "Pending": "pending"}
+NO_CLIENT = "No client"
+UNSCHEDULED = "Unscheduled"
+
+
+def empty_totals():
+    return dict.fromkeys(ROLLUP_FIELDS, 0.0)
+
+
+# Calendar month ("YYYY-MM") a payment is scheduled in
+
+
+def month_of(payment_schedule):
+    if not payment_schedule:
+        return UNSCHEDULED
+    if isinstance(payment_schedule, date):
+        return payment_schedule.strftime("%Y-%m")
+    return str(payment_schedule)[:7]
+
+
+def _add_to_bucket(buckets, month, status, amount):
+    bucket = buckets.setdefault(month, {})
+    bucket[status] = bucket.get(status, 0.0) + amount
+    if abs(bucket[status]) < 1e-9:
+        del bucket[status]
+    if not bucket:
+        del buckets[month]
+
+
+# Financial totals per project, per client and for the whole portfolio, kept up to date by deltas
+#
+# Every write that moves money (a project added or deleted, a spend entry, a new claim or a claim
+# status change) is applied as a change to the totals it touches, so reading any total is a dict
+# lookup no matter how many claims exist. remaining is budget - spent. Cash flow is bucketed by
+# the month of each claim's payment_schedule, split by status, per project and in total.
+
+
+class FinancialRollups:
+    def __init__(self, projects=(), spend=(), claims=()):
+        self.projects = {}
+        self.clients = {}
+        self.portfolio = empty_totals()
+        self.cash_flow = {}
+        self._client_of = {}
+        self._client_projects = {}
+        self._project_cash_flow = {}
+        for project in projects:
+            self.add_project(project)
+        for project_id, amount in spend:
+            self.add_spend(project_id, amount)
+        for project_id, claim in claims:
+            self.add_claim(project_id, claim)
+
+    def project(self, project_id):
+        return self.projects.get(project_id) or empty_totals()
+
+    def client(self, client):
+        return self.clients.get(client or NO_CLIENT) or empty_totals()
+
+    # Month -> {status: amount}, copied so callers can loop over it while other threads keep updating
+
+    def monthly(self, project_id=None):
+        buckets = self.cash_flow if project_id is None else self._project_cash_flow.get(project_id, {})
+        return {month: dict(bucket) for month, bucket in sorted(list(buckets.items()))}
+
+    # Updates
+
+    def _apply(self, project_id, **deltas):
+        if "budget" in deltas or "spent" in deltas:
+            deltas["remaining"] = deltas.get("budget", 0) - deltas.get("spent", 0)
+        for totals in (self.projects[project_id], self.clients[self._client_of[project_id]], self.portfolio):
+            for field, delta in deltas.items():
+                totals[field] += delta
+
+    def _apply_cash_flow(self, project_id, payment_schedule, status, amount):
+        month = month_of(payment_schedule)
+        _add_to_bucket(self.cash_flow, month, status, amount)
+        _add_to_bucket(self._project_cash_flow.setdefault(project_id, {}), month, status, amount)
+
+    def add_project(self, project):
+        project_id = project["id"]
+        self.remove_project(project_id)
+        client = project.get("client") or NO_CLIENT
+        self._client_of[project_id] = client
+        self._client_projects[client] = self._client_projects.get(client, 0) + 1
+        self.projects[project_id] = empty_totals()
+        self.clients.setdefault(client, empty_totals())
+        self._apply(project_id, budget=float(project.get("budget") or 0))
+
+    def remove_project(self, project_id):
+        totals = self.projects.get(project_id)
+        if totals is None:
+            return
+        self._apply(project_id, **{field: -value for field, value in totals.items() if field != "remaining"})
+        for month, bucket in self._project_cash_flow.pop(project_id, {}).items():
+            for status, amount in bucket.items():
+                _add_to_bucket(self.cash_flow, month, status, -amount)
+        client = self._client_of.pop(project_id)
+        del self.projects[project_id]
+        self._client_projects[client] -= 1
+        if not self._client_projects[client]:
+            del self._client_projects[client]
+            del self.clients[client]
+
+    def add_spend(self, project_id, amount):
+        if project_id in self.projects:
+            self._apply(project_id, spent=float(amount))
+
+    def add_claim(self, project_id, claim):
+        if project_id not in self.projects:
+            return
+        amount = float(claim.get("amount") or 0)
+        deltas = {"claimed": amount}
+        if claim.get("status") in CLAIM_BUCKETS:
+            deltas[CLAIM_BUCKETS[claim["status"]]] = amount
+        self._apply(project_id, **deltas)
+        self._apply_cash_flow(project_id, claim.get("payment_schedule"), claim.get("status"), amount)
+
+    def change_claim_status(self, project_id, claim, new_status):
+        if project_id not in self.projects or claim.get("status") == new_status:
+            return
+        amount = float(claim.get("amount") or 0)
+        deltas = {}
+        if claim.get("status") in CLAIM_BUCKETS:
+            deltas[CLAIM_BUCKETS[claim["status"]]] = -amount
+        if new_status in CLAIM_BUCKETS:
+            deltas[CLAIM_BUCKETS[new_status]] = deltas.get(CLAIM_BUCKETS[new_status], 0) + amount
+        self._apply(project_id, **deltas)
+        self._apply_cash_flow(project_id, claim.get("payment_schedule"), claim.get("status"), -amount)
+        self._apply_cash_flow(project_id, claim.get("payment_schedule"), new_status, amount)
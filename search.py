@@ -0,0 +1,264 @@
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+
+# Searchable task fields and how much a match in each one counts towards the score
+FIELD_WEIGHTS = {"task_name": 3.0, "assigned_to": 2.0, "description": 1.0, "comments": 1.0}
+# Score of a query word matching a token exactly, as a prefix, or through shared trigrams
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.7
+FUZZY_SCORE = 0.5
+# Fraction of a word's trigrams a token must contain to count as a fuzzy match
+FUZZY_THRESHOLD = 0.6
+# Upper bound on the tokens one query word can expand to, so a short prefix stays cheap
+MAX_EXPANSIONS = 64
+FILTER_FIELDS = ["project_id", "status", "priority", "deadline", "task_name", "assigned_to"]
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower()) if text else []
+
+
+def trigrams(token):
+    if len(token) < 3:
+        return {token}
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+# In-memory inverted index over tasks from every project
+#
+# `postings` maps each token to {task_id: best field weight}. Prefix lookups bisect a sorted
+# vocabulary, and typo/substring matches go through a trigram index over the vocabulary, never
+# over tasks, so expanding a query word costs the same however many tasks are indexed. Status,
+# priority, project and deadline have their own indexes. A query starts from whichever is smallest
+# - the postings of the rarest word or the narrowest filter - and only checks the remaining words
+# and filters against those candidates.
+
+
+class TaskSearchIndex:
+    def __init__(self, tasks=()):
+        self.docs = {}
+        self.postings = {}
+        self.vocab = []
+        self.vocab_trigrams = {}
+        self.by_project = {}
+        self.by_status = {}
+        self.by_priority = {}
+        self.deadlines = []
+        self._terms = {}
+        # While bulk loading, the sorted lists are appended to and sorted once at the end
+        self._bulk = True
+        for task in tasks:
+            self.add(task)
+        self._bulk = False
+        self.vocab.sort()
+        self.deadlines.sort()
+
+    def __len__(self):
+        return len(self.docs)
+
+    # Maintenance
+
+    def add(self, task):
+        task_id = task["id"]
+        if task_id in self.docs:
+            self.remove(task_id)
+        doc = self.docs[task_id] = {field: task.get(field) for field in FILTER_FIELDS}
+        self._index_fields(task_id, doc)
+        tokens = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            values = task.get(field)
+            for value in values if isinstance(values, list) else [values]:
+                for token in tokenize(value):
+                    tokens[token] = max(tokens.get(token, 0), weight)
+        self._index_tokens(task_id, tokens)
+
+    def add_comment(self, task_id, body):
+        if task_id in self.docs:
+            self._index_tokens(task_id, dict.fromkeys(tokenize(body), FIELD_WEIGHTS["comments"]))
+
+    def update(self, task_id, **fields):
+        doc = self.docs.get(task_id)
+        if doc is None:
+            return
+        self._unindex_fields(task_id, doc)
+        doc.update((field, value) for field, value in fields.items() if field in doc)
+        self._index_fields(task_id, doc)
+
+    def remove(self, task_id):
+        doc = self.docs.pop(task_id, None)
+        if doc is None:
+            return
+        self._unindex_fields(task_id, doc)
+        for token in self._terms.pop(task_id):
+            posting = self.postings[token]
+            del posting[task_id]
+            if not posting:
+                self._drop_token(token)
+
+    def remove_project(self, project_id):
+        for task_id in list(self.by_project.get(project_id, ())):
+            self.remove(task_id)
+
+    def _index_fields(self, task_id, doc):
+        self.by_project.setdefault(doc["project_id"], set()).add(task_id)
+        self.by_status.setdefault(doc["status"], set()).add(task_id)
+        self.by_priority.setdefault(doc["priority"], set()).add(task_id)
+        if doc["deadline"]:
+            if self._bulk:
+                self.deadlines.append((doc["deadline"], task_id))
+            else:
+                insort(self.deadlines, (doc["deadline"], task_id))
+
+    def _unindex_fields(self, task_id, doc):
+        for index, key in ((self.by_project, doc["project_id"]), (self.by_status, doc["status"]),
+                           (self.by_priority, doc["priority"])):
+            index[key].discard(task_id)
+            if not index[key]:
+                del index[key]
+        if doc["deadline"]:
+            del self.deadlines[bisect_left(self.deadlines, (doc["deadline"], task_id))]
+
+    def _index_tokens(self, task_id, tokens):
+        for token, weight in tokens.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                if self._bulk:
+                    self.vocab.append(token)
+                else:
+                    insort(self.vocab, token)
+                for gram in trigrams(token):
+                    self.vocab_trigrams.setdefault(gram, set()).add(token)
+            if posting.get(task_id, 0) < weight:
+                posting[task_id] = weight
+        # A tuple per task is much smaller than a set, and is only read when the task is removed
+        self._terms[task_id] = tuple(set(self._terms.get(task_id, ())).union(tokens))
+
+    def _drop_token(self, token):
+        del self.postings[token]
+        del self.vocab[bisect_left(self.vocab, token)]
+        for gram in trigrams(token):
+            tokens = self.vocab_trigrams[gram]
+            tokens.discard(token)
+            if not tokens:
+                del self.vocab_trigrams[gram]
+
+    # Queries
+
+    def _expand(self, word):
+        terms = {}
+        if word in self.postings:
+            terms[word] = EXACT_SCORE
+        position = bisect_left(self.vocab, word)
+        for token in self.vocab[position:position + MAX_EXPANSIONS]:
+            if not token.startswith(word):
+                break
+            terms.setdefault(token, PREFIX_SCORE)
+        if terms or len(word) < 3:
+            return terms
+
+        # Nothing starts with the word, so look for typos and substrings. A token sharing `needed`
+        # of the word's trigrams must contain one of its rarest (len - needed + 1) trigrams, so
+        # only those are used to collect candidates.
+        word_grams = sorted(trigrams(word), key=lambda gram: len(self.vocab_trigrams.get(gram, ())))
+        needed = math.ceil(FUZZY_THRESHOLD * len(word_grams))
+        candidates = set()
+        for gram in word_grams[:len(word_grams) - needed + 1]:
+            candidates.update(self.vocab_trigrams.get(gram, ()))
+        word_grams = set(word_grams)
+        shared = Counter({token: len(word_grams & trigrams(token)) for token in candidates})
+        for token, count in shared.most_common(MAX_EXPANSIONS):
+            if count < needed:
+                break
+            terms[token] = FUZZY_SCORE * count / max(len(word_grams), len(trigrams(token)))
+        return terms
+
+    def _deadline_range(self, deadline_from, deadline_to):
+        low = 0 if deadline_from is None else bisect_left(self.deadlines, (deadline_from,))
+        # A one-item tuple sorts before every (date, id) pair on that date; the "\0" suffix moves
+        # the upper bound past all tasks due on deadline_to
+        high = len(self.deadlines) if deadline_to is None else bisect_left(self.deadlines, (deadline_to + "\0",))
+        return low, high
+
+    # Ranked search; filters are exact matches except the deadline range (inclusive ISO date strings).
+    # Without query words the matching tasks are returned by deadline.
+
+    def search(self, query="", project_id=None, status=None, priority=None, deadline_from=None,
+               deadline_to=None, limit=50):
+        words = list(dict.fromkeys(tokenize(query)))
+        expansions = [self._expand(word) for word in words]
+        if any(not terms for terms in expansions):
+            return []
+        sized = sorted(((sum(len(self.postings[token]) for token in terms), terms) for terms in expansions),
+                       key=lambda item: item[0])
+
+        # Candidate sets from the filters, cheapest-to-check last; only the smallest is materialized
+        filters = []
+        if project_id is not None:
+            filters.append(self.by_project.get(project_id, set()))
+        if status is not None:
+            filters.append(self.by_status.get(status, set()))
+        if priority is not None:
+            filters.append(self.by_priority.get(priority, set()))
+        deadline_span = None
+        if deadline_from is not None or deadline_to is not None:
+            deadline_span = self._deadline_range(deadline_from, deadline_to)
+        sizes = [len(candidates) for candidates in filters]
+        if deadline_span is not None:
+            sizes.append(deadline_span[1] - deadline_span[0])
+
+        if not sized and not sizes and len(self.deadlines) >= min(limit, len(self.docs)):
+            # Nothing to narrow by: the earliest deadlines are simply the head of the deadline index
+            return [dict(self.docs[task_id], id=task_id, score=0.0) for _, task_id in self.deadlines[:limit]]
+        if not sized and not sizes:
+            scores = dict.fromkeys(self.docs, 0.0)
+            base = None
+        elif sized and (not sizes or sized[0][0] <= min(sizes)):
+            # Start from the postings of the rarest word
+            size, terms = sized.pop(0)
+            scores = {}
+            for token, term_score in terms.items():
+                for task_id, field_weight in self.postings[token].items():
+                    score = term_score * field_weight
+                    if score > scores.get(task_id, 0):
+                        scores[task_id] = score
+            base = None
+        else:
+            # Start from the narrowest filter
+            base = sizes.index(min(sizes))
+            if base < len(filters):
+                scores = dict.fromkeys(filters[base], 0.0)
+            else:
+                low, high = deadline_span
+                scores = {task_id: 0.0 for _, task_id in self.deadlines[low:high]}
+
+        # The remaining words and filters only narrow the candidates; the key intersections run in C
+        for _, terms in sized:
+            best = {}
+            for token, term_score in terms.items():
+                posting = self.postings[token]
+                for task_id in scores.keys() & posting.keys():
+                    score = term_score * posting[task_id]
+                    if score > best.get(task_id, 0):
+                        best[task_id] = score
+            scores = {task_id: scores[task_id] + score for task_id, score in best.items()}
+        for position, candidates in enumerate(filters):
+            if position != base:
+                scores = {task_id: scores[task_id] for task_id in scores.keys() & candidates}
+        if deadline_span is not None and base != len(filters):
+            docs = self.docs
+            scores = {task_id: score for task_id, score in scores.items()
+                      if (deadline_from is None or (docs[task_id]["deadline"] or "") >= deadline_from)
+                      and (deadline_to is None or (docs[task_id]["deadline"] or "\uffff") <= deadline_to)}
+
+        if words:
+            top = heapq.nlargest(limit, scores, key=lambda task_id: (scores[task_id], -task_id))
+        else:
+            top = heapq.nsmallest(limit, scores, key=lambda task_id: (self.docs[task_id]["deadline"] or "\uffff",
+                                                                      task_id))
+        return [dict(self.docs[task_id], id=task_id, score=round(scores[task_id], 3)) for task_id in top]
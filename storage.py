@@ -0,0 +1,81 @@
+import json
+
+SNAPSHOT_PATH = "projects.json"
+JOURNAL_PATH = "projects.journal"
+
+
+# Read-only loader for the JSON project store that came before the database
+#
+# The snapshot file holds the full project list as of sequence number `seq`; every mutation after
+# that is one JSON line in the journal, with a rotated `.old` segment left behind by a compaction
+# that never finished. load_projects() replays both on top of the snapshot and returns the project
+# list. Nothing is written: a torn last line is simply ignored.
+
+
+def load_projects(snapshot_path=SNAPSHOT_PATH, journal_path=JOURNAL_PATH):
+    try:
+        with open(snapshot_path, "r", encoding="utf-8") as file:
+            snapshot = json.load(file)
+    except FileNotFoundError:
+        snapshot = []
+    # Plain lists are snapshots written before the journal existed
+    if isinstance(snapshot, list):
+        projects, seq = snapshot, 0
+    else:
+        projects, seq = snapshot["projects"], snapshot["seq"]
+    for path in (f"{journal_path}.old", journal_path):
+        seq = _replay(projects, seq, path)
+    return projects
+
+
+def _replay(projects, seq, path):
+    try:
+        file = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return seq
+    with file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn write from a crash; nothing after it was ever acknowledged
+                break
+            if record["seq"] > seq:
+                _apply(projects, record)
+                seq = record["seq"]
+    return seq
+
+
+def _find(projects, project_id):
+    return next((proj for proj in projects if proj["id"] == project_id), None)
+
+
+def _apply(projects, record):
+    op, project_id, path, value = record["op"], record["id"], record["path"], record["value"]
+    if op == "put":
+        existing = _find(projects, project_id)
+        if existing is None:
+            projects.append(value)
+        else:
+            projects[projects.index(existing)] = value
+        return
+    if op == "delete":
+        projects[:] = [proj for proj in projects if proj["id"] != project_id]
+        return
+
+    # Field-level operations walk `path` inside the project to the parent container
+    container = _find(projects, project_id)
+    for key in path[:-1]:
+        container = container[key]
+    key = path[-1]
+    if op == "set":
+        container[key] = value
+    elif op == "append":
+        if isinstance(container, dict):
+            container.setdefault(key, []).append(value)
+        else:
+            container[key].append(value)
+    elif op == "remove":
+        del container[key]
+    else:
+        raise ValueError(f"Unknown journal operation {op!r}")
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Above this many bars in the visible range, the Gantt chart shows groups instead of single rows
+MAX_TIMELINE_BARS = 200
+# How over-threshold task timelines can be grouped, mapped to the column holding each group's label
+TASK_GROUPINGS = {"Assignee": "assigned_to", "Week": "week"}
+STATUS_COLORS = {"Pending": "#636efa", "In Progress": "#ffa15a", "Completed": "#00cc96"}
+TIMELINE_FIELDS = ["id", "task_name", "assigned_to", "status", "start_date", "deadline"]
+
+
+# Tasks as a frame of [start, finish) intervals
+# A task runs through the end of its deadline day. Tasks recorded before start dates existed are
+# drawn as a single day ending on their deadline; tasks without a deadline are left out. A task is
+# grouped under the week of its deadline, and under "Unassigned" when nobody is assigned.
+
+
+def task_frame(tasks):
+    frame = pd.DataFrame(tasks, columns=TIMELINE_FIELDS)
+    finish = pd.to_datetime(frame["deadline"], errors="coerce") + pd.Timedelta(days=1)
+    start = pd.to_datetime(frame["start_date"], errors="coerce")
+    frame["start"] = start.where(start < finish, finish - pd.Timedelta(days=1))
+    frame["finish"] = finish
+    deadline = finish - pd.Timedelta(days=1)
+    frame["week"] = deadline.dt.to_period("W").dt.start_time.dt.strftime("Week of %Y-%m-%d")
+    frame["assigned_to"] = frame["assigned_to"].fillna("").replace("", "Unassigned")
+    return frame.dropna(subset=["finish"]).sort_values(["start", "id"], ignore_index=True)
+
+
+def project_frame(projects):
+    frame = pd.DataFrame(projects, columns=["id", "name", "client", "start_date", "end_date"])
+    frame["start"] = pd.to_datetime(frame["start_date"], errors="coerce")
+    frame["finish"] = pd.to_datetime(frame["end_date"], errors="coerce") + pd.Timedelta(days=1)
+    frame["client"] = frame["client"].fillna("").replace("", "No client")
+    return frame.dropna(subset=["start", "finish"]).sort_values(["start", "id"], ignore_index=True)
+
+
+# Rows whose interval overlaps the inclusive date range; None leaves that side open
+
+
+def visible(frame, start=None, end=None):
+    mask = pd.Series(True, index=frame.index)
+    if start is not None:
+        mask &= frame["finish"] > pd.Timestamp(start)
+    if end is not None:
+        mask &= frame["start"] <= pd.Timestamp(end)
+    return frame[mask]
+
+
+# One bar per (group, status): it spans the group's earliest start to latest finish and is labelled
+# with how many rows it stands for. Rows with a blank key still count, in a group of their own.
+
+
+def binned(frame, group_column, color_column):
+    groups = frame.groupby(list(dict.fromkeys([group_column, color_column])), observed=True, sort=False,
+                           dropna=False)
+    return groups.agg(start=("start", "min"), finish=("finish", "max"), count=("id", "size")).reset_index()
+
+
+def _timeline(frame, y, color, title, **kwargs):
+    fig = px.timeline(frame, x_start="start", x_end="finish", y=y, color=color, title=title, **kwargs)
+    # Earliest rows at the top, as on a printed programme
+    fig.update_yaxes(autorange="reversed", title=None)
+    fig.update_layout(legend_title_text=None)
+    return fig
+
+
+# Gantt chart of one project's tasks; over MAX_TIMELINE_BARS tasks they are grouped by `group_by`
+
+
+def task_timeline(frame, group_by="Assignee", title="Task Timeline"):
+    if len(frame) <= MAX_TIMELINE_BARS:
+        return _timeline(frame, "task_name", "status", title, color_discrete_map=STATUS_COLORS,
+                         hover_data={"assigned_to": True, "task_name": False})
+    group_column = TASK_GROUPINGS[group_by]
+    groups = binned(frame, group_column, "status")
+    return _timeline(groups, group_column, "status", f"{title} ({len(frame):,} tasks by {group_by.lower()})",
+                     color_discrete_map=STATUS_COLORS, text="count", labels={"count": "Tasks"})
+
+
+# Every task as one line segment in a single WebGL trace per status
+# Bar charts have no WebGL mode, so this is the view for drawing thousands of tasks individually.
+# Rows are numbered in start order and the task name is in the hover text.
+
+
+def task_segments(frame, title="Task Timeline"):
+    fig = go.Figure()
+    # Row numbers are positions, whatever index the caller's (possibly filtered) frame has
+    frame = frame.reset_index(drop=True)
+    rows = np.arange(len(frame), dtype="float64")
+    for status, tasks in frame.groupby("status", sort=False):
+        # start, finish and a gap per task, so the segments are not joined up
+        gaps = np.full(len(tasks), np.datetime64("NaT"), dtype="datetime64[ns]")
+        x = np.column_stack([tasks["start"].to_numpy(), tasks["finish"].to_numpy(), gaps]).ravel()
+        y = np.column_stack([rows[tasks.index]] * 2 + [np.full(len(tasks), np.nan)]).ravel()
+        fig.add_trace(go.Scattergl(
+            x=x, y=y, text=np.repeat(tasks["task_name"].to_numpy(), 3), mode="lines", name=status,
+            line={"width": 4, "color": STATUS_COLORS.get(status)}, hovertemplate="%{text}<extra></extra>"))
+    fig.update_yaxes(autorange="reversed", title=None, showticklabels=False)
+    fig.update_layout(title=f"{title} ({len(frame):,} tasks)", legend_title_text=None)
+    return fig
+
+
+# Portfolio chart of project start/end dates; over MAX_TIMELINE_BARS projects they are grouped by client
+
+
+def portfolio_timeline(frame, title="Project Portfolio"):
+    if len(frame) <= MAX_TIMELINE_BARS:
+        return _timeline(frame, "name", "client", title, hover_data={"id": True})
+    groups = binned(frame, "client", "client")
+    return _timeline(groups, "client", "client", f"{title} ({len(frame):,} projects by client)",
+                     text="count", labels={"count": "Projects"})